@@ -1,13 +1,8 @@
 from PyQt5 import QtCore, QtGui, QtWidgets
-from sly import Lexer, Parser
 import os
-import copy
-import networkx as nx
-import matplotlib.pyplot as plt
-import re
-import pydot
-from networkx.drawing.nx_pydot import graphviz_layout
-import random
+from tiny_compiler import Compiler, IncrementalParser, PARSE_CACHE, PROFILE, ParseTrace, lex, relex, text_change
+from tiny_compiler.visualize import ast_layout, parse_tree_layout, show_ast, show_parse_tree
+from tiny_compiler.dfa import COMPILER_DFA, SKIPPED, STATE_NAMES, get_next_state
 
 
 def resource_path(relative_path):
@@ -21,244 +16,6 @@ def resource_path(relative_path):
     return os.path.join(base_path, relative_path)
 
 
-class Compiler(Lexer):
-    tokens = {NUMBER, ID,
-              EQ, LT, LE, GT, GE, NE, OPERATION_AND, OPERATION_OR, OPERATION_NOT, OPEN_BRACKET, CLOSED_BRACKET}
-    ignore = ' \t'
-    OPEN_BRACKET = r'[(]'
-    CLOSED_BRACKET = r'[)]'
-    EQ = r'=='
-    LE = r'<='
-    LT = r'<'
-    GE = r'>='
-    GT = r'>'
-    NE = r'!='
-    ID = r'[a-zA-Z_][a-zA-Z0-9_]*'
-    ignore_comment = r'\#.*'
-    OPERATION_AND = r'[&][&]'
-    OPERATION_OR = r'[|][|]'
-    OPERATION_NOT = r'!'
-
-    @_(r'\d+')
-    def NUMBER(self, t):
-        t.value = int(t.value)
-        return t
-
-    @_(r'\n+')
-    def ignore_newline(self, t):
-        self.lineno += t.value.count('\n')
-
-    def error(self, t):
-        raise ValueError('Line %d: Bad character %r' % (self.lineno, t.value[0]))
-        self.index += 1
-
-
-class Grammar():
-
-    def __init__(self, V=None, T=None, S=None, P=None):
-        if V:
-            self.variables = V
-        else:
-            self.variables = []
-
-        if S:
-            self.start = S
-        else:
-            self.start = ''
-
-        if T:
-            self.terminals = T
-        else:
-            self.terminals = []
-
-        if P:
-            self.productions = P
-        else:
-            self.productions = {}
-
-    def __str__(self):
-        '''Prints out G(V, T, S, P)'''
-        s = 'Grammar \n'
-        s = s + 'Start Symbol \n' + str(self.start) + '\n'
-        s = s + 'Terminals \n' + str(self.terminals) + '\n'
-        s = s + 'Variables \n' + str(self.variables) + '\n'
-        s = s + 'Productions \n' + str(self.productions) + '\n'
-        return s
-
-
-class Parser:
-
-    def __init__(self, grammar=None, table=None):
-        if table:
-            self.table = table
-        else:
-            self.table = {}
-
-        self.grammar = grammar
-        self.stack = []
-
-    def set_table(self, table):
-        self.table = table
-
-    def set_grammar(self, grammar):
-        self.grammar = grammar
-
-    def parse(self, process, input, verbose=False):
-        if not input: return "err"
-        self.stack = []
-        stack = self.stack
-        grammar = self.grammar
-        table = self.table
-        stack.append('$')
-        stack.append(grammar.start)
-        input.append('$')
-        next = input.pop(0)
-
-        while stack and next:
-            input_copy = copy.deepcopy(input)
-            input_copy.insert(0, next)
-            process[0].append(copy.deepcopy(stack))
-            process[1].append(input_copy)
-            if verbose: print(input, 'next :', next)
-            tos = stack.pop()
-            if verbose: print(stack, 'tos : ', tos)
-
-            if tos in grammar.variables:
-                p = table[tos].get(next, None)
-                if p == None:
-                    return False
-                if p != '':
-                    process[2].append(f"{tos} -> {p}")
-                    stack.extend(p.split(" ")[::-1])
-                else:
-                    process[2].append(f"{tos} -> ε")
-            else:
-                if next == tos:
-                    if input:
-                        process[2].append(f"pop -> {next}")
-                        next = input.pop(0)
-
-                else:
-                    print("String does not belong to the Grammar")
-                    return False
-
-        return True
-
-
-def get_input(input, flag=False):
-    current = 0
-    tokens = []
-    alphabet = re.compile(r'[a-zA-Z_][a-zA-Z0-9_]*', re.I)
-    space = re.compile(r"\s")
-    try:
-        while current < len(input):
-            char = input[current]
-            if re.match(space, char):
-                current = current+1
-                continue
-            elif char == '<':
-                tokens.append("<")
-                current = current+1
-                continue
-            elif char == '>':
-                tokens.append(">")
-                current = current+1
-                continue
-            elif char == '=':
-                tokens.append(">")
-                current = current+1
-                continue
-            elif char == '!':
-                tokens.append("!")
-                current = current+1
-                continue
-            elif char == '|':
-                if input[current+1] == "|":
-                    tokens.append("||")
-                    current = current+2
-                    continue
-            elif char == '&':
-                if input[current+1] == "&":
-                    tokens.append("&&")
-                    current = current+2
-                    continue
-            elif re.match(alphabet, char):
-                value = char
-                while re.fullmatch(alphabet, value):
-                    current = current+1
-                    if current < len(input):
-                        char = input[current]
-                        if not re.fullmatch(alphabet, value+char):break
-                        value += char
-                    else:break
-                if flag:
-                    tokens.append(value)
-                    continue
-                tokens.append("identifier")
-                continue
-            else: return
-    except:return
-    return tokens
-
-
-def parse(process, input:str):
-    rules = "exp : term exp'\n" \
-            "exp' : || term exp' |\n" \
-            "term : factor term'\n" \
-            "term' : && factor term' |\n" \
-            "factor : operand factor'\n" \
-            "factor' : comop operand factor' |\n" \
-            "comop : > | = | <\n" \
-            "operand : ! operand | identifier"
-    variables = ['exp', "exp'", 'term', "term'", 'factor', "factor'", 'comop', 'operand']
-    terminals = ['||', '', '&&', '>', '=', '<', '!', 'identifier']
-    productions = {'exp': ["term exp'"],
-                   "exp'": ["|| term exp'", ''],
-                   'term': ["factor term'"],
-                   "term'": ["&& factor term'", ''],
-                   'factor': ["operand factor'"],
-                   "factor'": ["comop operand factor'", ''],
-                   'comop': ['>', '=', '<'],
-                   'operand': ['! operand', 'identifier']}
-    start_var = "exp"
-    first = {'||': ['||'],
-             '': [''],
-             '&&': ['&&'],
-             '>': ['>'],
-             '=': ['='],
-             '<': ['<'],
-             '!': ['!'],
-             'identifier': ['identifier'],
-             'exp': ['identifier', '!'],
-             'term': ['identifier', '!'],
-             'factor': ['identifier', '!'],
-             'operand': ['identifier', '!'],
-             "exp'": ['', '||'],
-             "term'": ['', '&&'],
-             "factor'": ['', '>', '<', '='],
-             'comop': ['>', '<', '=']}
-    follow = {'exp': ['$'],
-              "exp'": ['$'],
-              'term': ['$', '||'],
-              "term'": ['$', '||'],
-              'factor': ['$', '&&', '||'],
-              "factor'": ['$', '&&', '||'],
-              'comop': ['!', 'identifier'],
-              'operand': ['||', '>', '<', '$', '=', '&&']}
-    parsing_table = {'exp': {'identifier': "term exp'", '!': "term exp'"},
-                     "exp'": {'||': "|| term exp'", '$': ''},
-                     'term': {'identifier': "factor term'", '!': "factor term'"},
-                     "term'": {'&&': "&& factor term'", '$': '', '||': ''},
-                     'factor': {'identifier': "operand factor'", '!': "operand factor'"},
-                     "factor'": {'>': "comop operand factor'", '<': "comop operand factor'", '=': "comop operand factor'", '$': '', '&&': '', '||': ''},
-                     'comop': {'>': '>', '=': '=', '<': '<'}, 'operand': {'!': '! operand', 'identifier': 'identifier'}}
-    grammer = Grammar(variables, terminals, start_var, productions)
-    parser = Parser(grammer)
-    parser.set_table(parsing_table)
-    input = get_input(input)
-    return parser.parse(process, input, verbose=False)
-
-
 class dfaprev(QtWidgets.QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -269,243 +26,167 @@ class dfaprev(QtWidgets.QDialog):
         self.image_lbl.setPixmap(QtGui.QPixmap(resource_path("ourdfa2.jpg")))
 
 
-def hierarchy_pos(G, root=None, width=1., vert_gap=0.2, vert_loc=0, xcenter=0.5):
+class TokenTableModel(QtCore.QAbstractTableModel):
+    '''
+    Token table of the compile page, read straight from the TokenArray and
+    the DFA states of every token. Cells are only formatted when the view
+    asks for them, i.e. for the rows on screen.
     '''
-    From Joel's answer at https://stackoverflow.com/a/29597209/2966723.
-    Licensed under Creative Commons Attribution-Share Alike
-
-    If the graph is a tree this will return the positions to plot this in a
-    hierarchical layout.
 
-    G: the graph (must be a tree)
+    headers = ("Token Type", "Token Value", "Token LineNo", "Token Index", "Current State")
 
-    root: the root node of current branch
-    - if the tree is directed and this is not given,
-      the root will be found and used
-    - if the tree is directed and this is given, then
-      the positions will be just for the descendants of this node.
-    - if the tree is undirected and not given,
-      then a random choice will be used.
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.tokens = None
+        self.states = None
 
-    width: horizontal space allocated for this branch - avoids overlap with other branches
+    def set_tokens(self, tokens, states):
+        self.beginResetModel()
+        self.tokens = tokens
+        self.states = states
+        self.endResetModel()
 
-    vert_gap: gap between levels of hierarchy
+    def clear(self):
+        self.set_tokens(None, None)
 
-    vert_loc: vertical location of root
+    def patch(self, edit):
+        '''
+        Applies a TokenEdit from relex to the tokens on show, and reruns the
+        DFA only as far as the states change.
+        '''
+        parent = QtCore.QModelIndex()
+        first, removed, added = edit.first, edit.removed, len(edit.types)
+        if removed > added:
+            self.beginRemoveRows(parent, first + added, first + removed - 1)
+        elif added > removed:
+            self.beginInsertRows(parent, first + removed, first + added - 1)
+        self.tokens.splice(edit)
+        stop = COMPILER_DFA.rerun(self.tokens, self.states, first, removed, added)
+        if removed > added:
+            self.endRemoveRows()
+        elif added > removed:
+            self.endInsertRows()
+        # offsets and line numbers of every later token moved as well
+        last = len(self.tokens) if edit.delta else stop
+        if last > first:
+            self.dataChanged.emit(self.index(first, 0), self.index(last - 1, len(self.headers) - 1))
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid() or self.tokens is None:
+            return 0
+        return len(self.tokens)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if role != QtCore.Qt.DisplayRole or not index.isValid():
+            return None
+        row = index.row()
+        column = index.column()
+        tokens = self.tokens
+        if column == 0:
+            return tokens.type(row)
+        if column == 1:
+            return str(tokens.value(row))
+        if column == 2:
+            return str(tokens.line(row))
+        if column == 3:
+            return str(tokens.starts[row])
+        if tokens.type(row) in SKIPPED:
+            return ""
+        return STATE_NAMES[self.states[row]]
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role != QtCore.Qt.DisplayRole:
+            return None
+        if orientation == QtCore.Qt.Horizontal:
+            return self.headers[section]
+        return str(section + 1)
+
+
+class ParseTraceModel(QtCore.QAbstractTableModel):
+    '''
+    Parse table of the parse page, read from a ParseTrace. The stack and
+    input snapshots of a step are only rebuilt and formatted when its row
+    is shown. The move of the last step is the result of the parse.
+    '''
 
-    xcenter: horizontal location of root
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.trace = None
+
+    def set_trace(self, trace):
+        self.beginResetModel()
+        self.trace = trace
+        self.endResetModel()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid() or self.trace is None:
+            return 0
+        return len(self.trace)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(ParseTrace.headers)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if role != QtCore.Qt.DisplayRole or not index.isValid():
+            return None
+        step = index.row()
+        column = index.column()
+        if column == 0:
+            return str(self.trace.stack(step))
+        if column == 1:
+            return str(self.trace.input(step))
+        move = self.trace.move(step)
+        if move is None and step == len(self.trace) - 1:
+            return "Success!" if self.trace.result else "Fail!"
+        return move
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role != QtCore.Qt.DisplayRole:
+            return None
+        if orientation == QtCore.Qt.Horizontal:
+            return ParseTrace.headers[section]
+        return str(section + 1)
+
+
+class WorkerSignals(QtCore.QObject):
+    finished = QtCore.pyqtSignal(object)
+    failed = QtCore.pyqtSignal(object)
+
+
+class Worker(QtCore.QRunnable):
+    '''
+    Runs fn(*args) on a QThreadPool and sends back the result, or the
+    exception it raised, through signals delivered on the GUI thread. The
+    work itself can't be stopped halfway: a cancelled job just never reports.
     '''
-    if not nx.is_tree(G):
-        raise TypeError('cannot use hierarchy_pos on a graph that is not a tree')
 
-    if root is None:
-        if isinstance(G, nx.DiGraph):
-            root = next(iter(nx.topological_sort(G)))  # allows back compatibility with nx version 1.11
-        else:
-            root = random.choice(list(G.nodes))
+    def __init__(self, fn, *args):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.cancelled = False
+        self.signals = WorkerSignals()
 
-    def _hierarchy_pos(G, root, width=1., vert_gap=0.2, vert_loc=0, xcenter=0.5, pos=None, parent=None):
-        '''
-        see hierarchy_pos docstring for most arguments
+    def cancel(self):
+        self.cancelled = True
 
-        pos: a dict saying where all nodes go if they have been assigned
-        parent: parent of this branch. - only affects it if non-directed
+    def run(self):
+        if self.cancelled:
+            return
+        try:
+            result = self.fn(*self.args)
+        except Exception as e:
+            if not self.cancelled: self.signals.failed.emit(e)
+            return
+        if not self.cancelled: self.signals.finished.emit(result)
 
-        '''
 
-        if pos is None:
-            pos = {root: (xcenter, vert_loc)}
-        else:
-            pos[root] = (xcenter, vert_loc)
-        children = list(G.neighbors(root))
-        if not isinstance(G, nx.DiGraph) and parent is not None:
-            children.remove(parent)
-        if len(children) != 0:
-            dx = width / len(children)
-            nextx = xcenter - width / 2 - dx / 2
-            for child in children:
-                nextx += dx
-                pos = _hierarchy_pos(G, child, width=dx, vert_gap=vert_gap,
-                                     vert_loc=vert_loc - vert_gap, xcenter=nextx,
-                                     pos=pos, parent=root)
-        return pos
-
-    return _hierarchy_pos(G, root, width, vert_gap, vert_loc, xcenter)
-
-
-def draw_ast(text:str, verbose=False):
-    tree = nx.DiGraph()
-    nodes = []
-    text = get_input(text, True)
-    labels = dict()
-    for index, element in enumerate(text): labels[index] = [element, element]
-    for index in range(0, len(text)): nodes.append(index)
-    while True:
-        if verbose:
-            print(labels)
-            print(nodes)
-        if len(nodes) == 1:
-            if len(tree.nodes) == 0:
-                tree.add_node(0)
-                node = nodes[0]
-                nx.draw_networkx(tree, labels={0:labels[node][1]}, node_size=len(labels[node][1])*360)
-                plt.get_current_fig_manager().set_window_title("Abstract Syntax Tree Visualizer")
-                plt.tight_layout()
-                plt.show()
-                break
-            act_labels = dict()
-            for node in list(tree.nodes):
-                if node in list(tree.nodes): act_labels[node] = labels[node][1]
-            if verbose:print(labels)
-            pos = hierarchy_pos(tree)
-            nx.draw_networkx(tree, pos=pos, labels=act_labels, node_size=[len(act_labels[node]) * 300 for node in list(tree.nodes)])
-            plt.get_current_fig_manager().set_window_title("Abstract Syntax Tree Visualizer")
-            plt.tight_layout()
-            plt.show()
-            break
-        flag = False
-        for index in range(0, len(nodes)):
-            if labels[nodes[index]][0] == "!":
-                child = nodes[index + 1]
-                if labels[child][0] == "!":continue
-                parent = max(nodes) + 1
-                labels[parent] = ["! " + labels[child][1], "!"]
-                tree.add_edge(parent, child)
-                nodes.pop(index)
-                nodes.pop(index)
-                nodes.insert(index, parent)
-                flag = True
-                break
-        if flag: continue
-        flag = False
-        for index in range(0, len(nodes)):
-            if labels[nodes[index]][0] == ">":
-                left = nodes[index - 1]
-                right = nodes[index + 1]
-                parent = max(nodes) + 1
-                labels[parent] = [labels[left][1] + " > " + labels[right][1], ">"]
-                tree.add_edge(parent, left)
-                tree.add_edge(parent, right)
-                nodes.pop(index - 1)
-                nodes.pop(index - 1)
-                nodes.pop(index - 1)
-                nodes.insert(index - 1, parent)
-                flag = True
-                break
-            elif labels[nodes[index]][0] == "<":
-                left = nodes[index - 1]
-                right = nodes[index + 1]
-                parent = max(nodes) + 1
-                labels[parent] = [labels[left][1] + " < " + labels[right][1], "<"]
-                tree.add_edge(parent, left)
-                tree.add_edge(parent, right)
-                nodes.pop(index - 1)
-                nodes.pop(index - 1)
-                nodes.pop(index - 1)
-                nodes.insert(index - 1, parent)
-                flag = True
-                break
-            elif labels[nodes[index]][0] == "=":
-                left = nodes[index - 1]
-                right = nodes[index + 1]
-                parent = max(nodes) + 1
-                labels[parent] = [labels[left][1] + " = " + labels[right][1], "="]
-                tree.add_edge(parent, left)
-                tree.add_edge(parent, right)
-                nodes.pop(index - 1)
-                nodes.pop(index - 1)
-                nodes.pop(index - 1)
-                nodes.insert(index - 1, parent)
-                flag = True
-                break
-        if flag: continue
-        flag = False
-        for index in range(0, len(nodes)):
-            if labels[nodes[index]][0] == "&&":
-                left = nodes[index - 1]
-                right = nodes[index + 1]
-                parent = max(nodes) + 1
-                labels[parent] = [labels[left][1] + " && " + labels[right][1], "&&"]
-                tree.add_edge(parent, left)
-                tree.add_edge(parent, right)
-                nodes.pop(index - 1)
-                nodes.pop(index - 1)
-                nodes.pop(index - 1)
-                nodes.insert(index - 1, parent)
-                flag = True
-                break
-        if flag: continue
-        for index in range(0, len(nodes)):
-            if labels[nodes[index]][0] == "||":
-                left = nodes[index-1]
-                right = nodes[index+1]
-                parent = max(nodes)+1
-                labels[parent] = [labels[left][1] + " || " + labels[right][1], "||"]
-                tree.add_edge(parent, left)
-                tree.add_edge(parent, right)
-                nodes.pop(index - 1)
-                nodes.pop(index - 1)
-                nodes.pop(index - 1)
-                nodes.insert(index - 1, parent)
-                break
-
-
-def draw_parse_tree(moves:list, verbose=False):
-    tree = nx.DiGraph()
-    nodes = []
-    labels = dict()
-    labels[0] = "exp"
-    nodes.append(0)
-    tree.add_node(0)
-    for move in moves:
-        temp_m = move.split("->")
-        temp_prod = temp_m[1]
-        temp_prod = temp_prod.split(" ")
-        while "" in temp_prod:temp_prod.remove("")
-        parent_index = 0
-        if temp_m[0].strip() == "pop": continue
-        for index in range(0, len(nodes)):
-            if labels[nodes[index]] == temp_m[0].strip():
-                parent_index = index
-                break
-        if len(temp_prod) == 3:
-            left = max(nodes) + 1
-            mid = left + 1
-            right = mid + 1
-            labels[left] = temp_prod[0]
-            labels[mid] = temp_prod[1]
-            labels[right] = temp_prod[2]
-            tree.add_edge(nodes[parent_index], left)
-            tree.add_edge(nodes[parent_index], mid)
-            tree.add_edge(nodes[parent_index], right)
-            if verbose:print(f"Parent {nodes[parent_index]} : {labels[nodes[parent_index]]}, left {left} : {labels[left]}, mid {mid} : {labels[mid]}, right {right} : {labels[right]}")
-            nodes.pop(parent_index)
-            nodes.insert(parent_index, left)
-            nodes.insert(parent_index, mid)
-            nodes.insert(parent_index, right)
-        elif len(temp_prod) == 2:
-            left = max(nodes) + 1
-            right = left + 1
-            labels[left] = temp_prod[0]
-            labels[right] = temp_prod[1]
-            tree.add_edge(nodes[parent_index], left)
-            tree.add_edge(nodes[parent_index], right)
-            if verbose:print(f"Parent {nodes[parent_index]} : {labels[nodes[parent_index]]}, left {left} : {labels[left]}, right {right} : {labels[right]}")
-            nodes.pop(parent_index)
-            nodes.insert(parent_index, left)
-            nodes.insert(parent_index, right)
-        else:
-            child = max(nodes) + 1
-            labels[child] = temp_prod[0]
-            tree.add_edge(nodes[parent_index], child)
-            if verbose:print(f"Parent {nodes[parent_index]} : {labels[nodes[parent_index]]}, child {child} : {labels[child]}")
-            nodes.pop(parent_index)
-            nodes.insert(parent_index, child)
-    pos = graphviz_layout(tree, prog="dot")
-    nx.draw_networkx(tree, pos=pos, labels=labels, node_size=[len(labels[node]) * 260 for node in list(tree.nodes)])
-    plt.tight_layout()
-    plt.get_current_fig_manager().set_window_title("Parse Tree Visualizer")
-    plt.show()
+def compile_job(data):
+    tokens = Compiler().scan(data)
+    return tokens, COMPILER_DFA.run(tokens), COMPILER_DFA.accepts(tokens)
 
 
 class Ui_MainWindow(object):
@@ -518,28 +199,16 @@ class Ui_MainWindow(object):
         self.timer = QtCore.QTimer(MainWindow)
         self.timer.setInterval(400)
         self.timer.timeout.connect(self.update_status)
+        self.pool = QtCore.QThreadPool.globalInstance()
+        self.jobs = {}
         self.centralwidget = QtWidgets.QWidget(MainWindow)
         self.centralwidget.setObjectName("centralwidget")
-        self.tokentable = QtWidgets.QTableWidget(self.centralwidget)
+        self.tokentable = QtWidgets.QTableView(self.centralwidget)
         self.tokentable.setGeometry(QtCore.QRect(460, 41, 651, 491))
         self.tokentable.setObjectName("tokentable")
-        self.tokentable.setColumnCount(5)
-        self.tokentable.setEditTriggers(QtWidgets.QTableWidget.NoEditTriggers)
-        item = QtWidgets.QTableWidgetItem()
-        item.setText("Token Type")
-        self.tokentable.setHorizontalHeaderItem(0, item)
-        item = QtWidgets.QTableWidgetItem()
-        item.setText("Token Value")
-        self.tokentable.setHorizontalHeaderItem(1, item)
-        item = QtWidgets.QTableWidgetItem()
-        item.setText("Token LineNo")
-        self.tokentable.setHorizontalHeaderItem(2, item)
-        item = QtWidgets.QTableWidgetItem()
-        item.setText("Token Index")
-        self.tokentable.setHorizontalHeaderItem(3, item)
-        item = QtWidgets.QTableWidgetItem()
-        item.setText("Current State")
-        self.tokentable.setHorizontalHeaderItem(4, item)
+        self.tokenmodel = TokenTableModel(self.tokentable)
+        self.tokentable.setModel(self.tokenmodel)
+        self.tokentable.setEditTriggers(QtWidgets.QTableView.NoEditTriggers)
         self.codeinput = QtWidgets.QTextEdit(self.centralwidget)
         self.codeinput.setGeometry(QtCore.QRect(10, 40, 441, 411))
         self.codeinput.setObjectName("codeinput")
@@ -581,22 +250,15 @@ class Ui_MainWindow(object):
         font.setPointSize(10)
         self.label_3.setFont(font)
         self.label_3.setObjectName("label_3")
-        self.parsetable = QtWidgets.QTableWidget(self.centralwidget)
+        self.parsetable = QtWidgets.QTableView(self.centralwidget)
         self.parsetable.setGeometry(QtCore.QRect(10, 39, 1101, 481))
         self.parsetable.setShowGrid(True)
         self.parsetable.setWordWrap(True)
         self.parsetable.setCornerButtonEnabled(True)
         self.parsetable.setObjectName("parsetable")
-        self.parsetable.setColumnCount(3)
-        self.parsetable.setRowCount(1)
-        item = QtWidgets.QTableWidgetItem()
-        self.parsetable.setVerticalHeaderItem(0, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.parsetable.setHorizontalHeaderItem(0, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.parsetable.setHorizontalHeaderItem(1, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.parsetable.setHorizontalHeaderItem(2, item)
+        self.parsemodel = ParseTraceModel(self.parsetable)
+        self.parsetable.setModel(self.parsemodel)
+        self.parsetable.setEditTriggers(QtWidgets.QTableView.NoEditTriggers)
         self.parsetable.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Stretch)
         self.parseinput = QtWidgets.QLineEdit(self.centralwidget)
         self.parseinput.setGeometry(QtCore.QRect(20, 530, 481, 31))
@@ -649,6 +311,12 @@ class Ui_MainWindow(object):
         self.statusbar = QtWidgets.QStatusBar(MainWindow)
         self.statusbar.setObjectName("statusbar")
         MainWindow.setStatusBar(self.statusbar)
+        self.profilelabel = QtWidgets.QLabel(self.statusbar)
+        self.profilelabel.setObjectName("profilelabel")
+        self.statusbar.addPermanentWidget(self.profilelabel)
+        self.profilebox = QtWidgets.QCheckBox(self.statusbar)
+        self.profilebox.setObjectName("profilebox")
+        self.statusbar.addPermanentWidget(self.profilebox)
 
 
         if True:
@@ -684,7 +352,12 @@ class Ui_MainWindow(object):
             self.backbtn.setHidden(True)
 
 
-        self.process = [["Stack"], ["Input"], ["Move"]]
+        self.process = ParseTrace()
+        self.entry = None
+        self.lexed = None
+        self.wide_code = False
+        self.reparser = IncrementalParser()
+        self.parsetokens = None
         self.status = ""
         self.codeinput.setFontPointSize(10)
         self.compilebtn.clicked.connect(self.compile)
@@ -696,6 +369,11 @@ class Ui_MainWindow(object):
         self.parsebtn.clicked.connect(self.parse)
         self.astbtn.clicked.connect(self.ast_click)
         self.parsetreebtn.clicked.connect(self.parse_tree_click)
+        self.codeinput.textChanged.connect(self.cancel_compile)
+        self.codeinput.document().contentsChange.connect(self.code_changed)
+        self.parseinput.textEdited.connect(lambda text: self.cancel_job("parse"))
+        self.parseinput.textEdited.connect(self.parse_changed)
+        self.profilebox.toggled.connect(self.profile_toggled)
         self.timer.start()
         self.retranslateUi(MainWindow)
         QtCore.QMetaObject.connectSlotsByName(MainWindow)
@@ -711,14 +389,6 @@ class Ui_MainWindow(object):
         self.dfabtn.setText(_translate("MainWindow", "Preview Compiler DFA"))
         self.label_2.setText(_translate("MainWindow", "Token List:"))
         self.label_3.setText(_translate("MainWindow", "Status: "))
-        item = self.parsetable.verticalHeaderItem(0)
-        item.setText(_translate("MainWindow", "0"))
-        item = self.parsetable.horizontalHeaderItem(0)
-        item.setText(_translate("MainWindow", "Stack"))
-        item = self.parsetable.horizontalHeaderItem(1)
-        item.setText(_translate("MainWindow", "Input"))
-        item = self.parsetable.horizontalHeaderItem(2)
-        item.setText(_translate("MainWindow", "Move"))
         self.parseinput.setPlaceholderText(_translate("MainWindow", "Enter Code To Parse!"))
         self.parsebtn.setText(_translate("MainWindow", "Parse"))
         self.astbtn.setText(_translate("MainWindow", "Show AST"))
@@ -728,6 +398,8 @@ class Ui_MainWindow(object):
         self.maincompilebtn.setText(_translate("MainWindow", "Compile"))
         self.mainparsebtn.setText(_translate("MainWindow", "Parse"))
         self.mainlabel.setText(_translate("MainWindow", "Welcome To Tiny Language Compiler!"))
+        self.profilebox.setText(_translate("MainWindow", "Profile"))
+        self.profilebox.setToolTip(_translate("MainWindow", "Time every stage of compiling, parsing and drawing, shown next to this box"))
 
     def backbtn_click(self):
         if self.astbtn.isHidden() == False:
@@ -860,154 +532,182 @@ class Ui_MainWindow(object):
         dialog.show()
 
     def get_next_state(self, token, current_state):
-        if current_state == "START":
-            if token == "ID" or token == "NUMBER":
-                current_state = "NUMBER_OR_ID"
-            elif token == "OPERATION_NOT":
-                current_state = "IN_OPERATION"
-            else:
-                current_state = "FAILED"
-        elif current_state == "NUMBER_OR_ID":
-            if token == "EQ" or token == "LE" or token == "LT" or token == "GE" or token == "GT" or token == "NE" or token == "OPERATION_AND" or token == "OPERATION_OR":
-                current_state = "IN_OPERATION"
-            else:
-                current_state = "FAILED"
-        elif current_state == "IN_OPERATION":
-            if token == "ID" or token == "NUMBER":
-                current_state = "NUMBER_OR_ID"
-            elif token == "OPERATION_NOT":
-                current_state = "IN_OPERATION"
-            else:
-                current_state = "FAILED"
-        elif current_state == "FAILED":
-            current_state = "FAILED"
-        return current_state
+        return get_next_state(token, current_state)
+
+    def start_job(self, name, done, fn, *args, failed=None):
+        '''
+        Runs fn(*args) in the background as the job called name, replacing
+        (and cancelling) the one running under that name. done(result), or
+        failed(exception), is called on the GUI thread when it finishes.
+        '''
+        self.cancel_job(name)
+        worker = Worker(fn, *args)
+        failed = failed or self.job_failed
+        worker.signals.finished.connect(lambda result: self.finish_job(name, worker, done, result))
+        worker.signals.failed.connect(lambda error: self.finish_job(name, worker, failed, error))
+        self.jobs[name] = worker
+        self.pool.start(worker)
+
+    def cancel_job(self, name):
+        worker = self.jobs.pop(name, None)
+        if worker is not None:
+            worker.cancel()
+
+    def finish_job(self, name, worker, callback, value):
+        # a result can still be queued when the job gets cancelled
+        if worker.cancelled or self.jobs.get(name) is not worker:
+            return
+        del self.jobs[name]
+        callback(value)
+        self.show_profile()
+
+    def profile_toggled(self, on):
+        PROFILE.reset()
+        self.profilelabel.clear()
+        if on:
+            PROFILE.enable()
+        else:
+            PROFILE.disable()
+
+    def show_profile(self):
+        '''Shows the stage timings recorded since the last call, the full table as tooltip.'''
+        if PROFILE.enabled and PROFILE.timings:
+            self.profilelabel.setText(PROFILE.summary())
+            self.profilelabel.setToolTip(PROFILE.format())
+            PROFILE.reset()
+
+    def job_failed(self, error):
+        self.popup("Error", "err", "Failure", "Please Make Sure Parsing is Successful", str(error))
 
     def compile(self):
-        lexer = Compiler()
-        env = {}
         data = self.codeinput.toPlainText()
-        if not data:
-            self.status = ""
-            self.tokentable.setRowCount(0)
+        self.status = ""
         vwidth = self.tokentable.verticalHeader().width()
         hwidth = self.tokentable.horizontalHeader().length()
         swidth = self.tokentable.style().pixelMetric(QtWidgets.QStyle.PM_ScrollBarExtent)
         fwidth = self.tokentable.frameWidth() * 2
         self.tokentable.setFixedWidth(vwidth + hwidth + swidth + fwidth)
-        counter = 1
-        current_state = "START"
-        try:
-            for tok in lexer.tokenize(data):
-                self.tokentable.setRowCount(counter)
-                item = QtWidgets.QTableWidgetItem()
-                item.setText(str(counter))
-                self.tokentable.setVerticalHeaderItem(counter - 1, item)
-                item = QtWidgets.QTableWidgetItem()
-                item.setText(str(tok.type))
-                self.tokentable.setItem(counter - 1, 0, item)
-                item = QtWidgets.QTableWidgetItem()
-                item.setText(str(tok.value))
-                self.tokentable.setItem(counter - 1, 1, item)
-                item = QtWidgets.QTableWidgetItem()
-                item.setText(str(tok.lineno))
-                self.tokentable.setItem(counter - 1, 2, item)
-                item = QtWidgets.QTableWidgetItem()
-                item.setText(str(tok.index))
-                self.tokentable.setItem(counter - 1, 3, item)
-                item = QtWidgets.QTableWidgetItem()
-                if str(tok.type) != "OPEN_BRACKET" and str(tok.type) != "CLOSED_BRACKET":
-                    current_state = self.get_next_state(str(tok.type), current_state)
-                    item.setText(str(current_state))
-                else:
-                    item.setText(str(""))
-                self.tokentable.setItem(counter - 1, 4, item)
-                counter += 1
-        except ValueError as e:
-            self.tokentable.setRowCount(0)
-            msg = QtWidgets.QMessageBox()
-            msg.setWindowTitle("Error")
-            msg.setWindowIcon(QtGui.QIcon(resource_path("icon.png")))
-            msg.setText("Compilation Error: ")
-            msg.setIcon(QtWidgets.QMessageBox.Critical)
-            msg.setInformativeText(str(e))
-            x = msg.exec_()
-            return
         self.timer.start()
+        self.start_job("compile", lambda result: self.compiled(data, result), compile_job, data, failed=self.compile_failed)
+
+    def cancel_compile(self):
+        '''Drops a compile that is still running, the code it was given has changed.'''
+        if "compile" in self.jobs:
+            self.cancel_job("compile")
+            self.status = "Status: Compilation Cancelled"
+            self.update_status()
+
+    def code_changed(self, position, removed, added):
+        '''Keeps the token table in step with the code as it is typed.'''
+        data = self.codeinput.toPlainText()
+        model = self.tokenmodel
+        # contentsChange counts UTF-16 code units and relex code points, which
+        # differ while a character past U+FFFF (an emoji) is in the text; then
+        # the edit is worked out by comparing the texts
+        wide = self.codeinput.document().characterCount() - 1 != len(data)
+        was_wide, self.wide_code = self.wide_code, wide
         try:
-            if data:
-                minus = 2
-                while self.tokentable.item(counter-minus, 4).text() == "":
-                    minus += 1
-                if self.tokentable.item(counter-minus, 4).text() == "NUMBER_OR_ID":
-                    self.status = "Status: Parsing Success"
-                else:
-                    self.status = "Status: Parsing Failed"
-        except:
-            self.status = "Status: Parsing Failed"
+            if model.tokens is not None:
+                if wide or was_wide:
+                    position, removed, added = text_change(model.tokens.text, data)
+                model.patch(relex(model.tokens, data, position, removed, added))
+            elif self.lexed is not None:
+                # the table was cleared by a bad character, pick up from the
+                # last tokens that lexed instead of starting over
+                tokens, states = self.lexed
+                edit = relex(tokens, data, *text_change(tokens.text, data))
+                tokens.splice(edit)
+                COMPILER_DFA.rerun(tokens, states, edit.first, edit.removed, len(edit.types))
+                model.set_tokens(tokens, states)
+            else:
+                tokens = lex(data)
+                model.set_tokens(tokens, COMPILER_DFA.run(tokens))
+            self.lexed = (model.tokens, model.states)
+        except ValueError:
+            # no tokens until the bad character is gone, Compile tells where it is
+            model.clear()
+        self.show_profile()
+
+    def compiled(self, data, result):
+        tokens, states, accepted = result
+        self.tokenmodel.set_tokens(tokens, states)
+        self.lexed = (tokens, states)
+        if data:
+            if accepted:
+                self.status = "Status: Parsing Success"
+            else:
+                self.status = "Status: Parsing Failed"
+
+    def compile_failed(self, error):
+        self.tokenmodel.clear()
+        self.status = "Status: Compilation Error"
+        self.update_status()
+        msg = QtWidgets.QMessageBox()
+        msg.setWindowTitle("Error")
+        msg.setWindowIcon(QtGui.QIcon(resource_path("icon.png")))
+        msg.setText("Compilation Error: ")
+        msg.setIcon(QtWidgets.QMessageBox.Critical)
+        msg.setInformativeText(str(error))
+        x = msg.exec_()
 
     def parse(self):
-        self.parsetable.setRowCount(0)
-        self.process = [["Stack"], ["Input"], ["Move"]]
+        self.process = ParseTrace()
+        self.parsemodel.set_trace(None)
+        self.cancel_job("ast")
+        self.cancel_job("tree")
         if self.parseinput.text():
-            if parse(self.process, input=self.parseinput.text()) == "err":
-                self.popup("Error", "err", "Input Doesn't belong to Grammar!!", "Please Make Sure The String has passed Compilation Phase!")
-                return
-            self.parsetable.setRowCount(0)
-            self.parsetable.setColumnCount(3)
-            self.parsetable.setEditTriggers(QtWidgets.QTableWidget.NoEditTriggers)
-            item = QtWidgets.QTableWidgetItem()
-            item.setText("Stack")
-            self.parsetable.setHorizontalHeaderItem(0, item)
-            item = QtWidgets.QTableWidgetItem()
-            item.setText("Input")
-            self.parsetable.setHorizontalHeaderItem(1, item)
-            item = QtWidgets.QTableWidgetItem()
-            item.setText("Move")
-            self.parsetable.setHorizontalHeaderItem(2, item)
-            counter = 1
-            max_index = 0
-            for arr in self.process[0]:
-                if len(arr) > len(self.process[0][max_index]): max_index = self.process[0].index(arr)
-            try:
-                for index in range(1, len(self.process[0])):
-                    self.parsetable.setRowCount(counter)
-                    item = QtWidgets.QTableWidgetItem()
-                    item.setText(str(counter))
-                    self.parsetable.setVerticalHeaderItem(counter - 1, item)
-                    item = QtWidgets.QTableWidgetItem()
-                    item.setText(str(self.process[0][index]))
-                    self.parsetable.setItem(counter - 1, 0, item)
-                    item = QtWidgets.QTableWidgetItem()
-                    item.setText(str(self.process[1][index]))
-                    self.parsetable.setItem(counter - 1, 1, item)
-                    item = QtWidgets.QTableWidgetItem()
-                    item.setText(str(self.process[2][index]))
-                    self.parsetable.setItem(counter - 1, 2, item)
-                    counter += 1
-            except:
-                item = QtWidgets.QTableWidgetItem()
-                if self.parsetable.item(self.parsetable.rowCount()-1, 0).text() == "['$']" and self.parsetable.item(self.parsetable.rowCount()-1, 1).text() == "['$']":
-                    item.setText("Success!")
-                    self.popup("Result", "Information", "Parsing Successful!", f"Parsing Finished in {self.parsetable.rowCount()} Steps")
-                else:
-                    item.setText("Fail!")
-                    self.popup("Result", "err", "Parsing Failed!", f"Parsing Failed at Step {self.parsetable.rowCount()}")
-                self.parsetable.setItem(counter - 1, 2, item)
+            self.start_job("parse", self.parsed, lambda text: PARSE_CACHE.get(text, trace=True), self.parseinput.text())
+
+    def parse_changed(self, text):
+        '''Shows whether the parse input parses while it is typed, reparsing only around the edit.'''
+        tokens = self.parsetokens
+        try:
+            if tokens is None:
+                tokens = lex(text)
+                result = self.reparser.parse(tokens)
+                self.parsetokens = tokens
+            else:
+                edit = relex(tokens, text, *text_change(tokens.text, text))
+                tokens.splice(edit)
+                result = self.reparser.edit(tokens, edit.first, edit.removed, len(edit.types))
+        except ValueError:
+            result = "err"
+        if not text:
+            self.statusbar.clearMessage()
+        elif result == "err":
+            self.statusbar.showMessage("Status: Input Doesn't belong to Grammar")
+        elif result:
+            self.statusbar.showMessage("Status: Parsing Success")
+        else:
+            self.statusbar.showMessage("Status: Parsing Failed")
+        self.show_profile()
+
+    def parsed(self, entry):
+        self.entry = entry
+        self.process, result = entry.trace, entry.result
+        if result == "err":
+            self.popup("Error", "err", "Input Doesn't belong to Grammar!!", "Please Make Sure The String has passed Compilation Phase!")
+            return
+        self.parsemodel.set_trace(self.process)
+        if result:
+            self.popup("Result", "Information", "Parsing Successful!", f"Parsing Finished in {len(self.process)} Steps")
+        else:
+            self.popup("Result", "err", "Parsing Failed!", f"Parsing Failed at Step {len(self.process)}")
 
     def ast_click(self):
-        if not self.parsetable.item(self.parsetable.rowCount()-1, 2):
+        if self.process.result is not True:
             self.popup("Error", "err", "Failure", "Please Make Sure Parsing is Successful")
             return
-        elif self.parsetable.item(self.parsetable.rowCount()-1, 2).text() != "Success!":
+        self.start_job("ast", lambda layout: self.show_tree(show_ast, layout), lambda entry: ast_layout(entry.ast), self.entry)
+
+    def parse_tree_click(self):
+        if self.process.result is None:
             self.popup("Error", "err", "Failure", "Please Make Sure Parsing is Successful")
             return
-        else:
-            try: draw_ast(self.parseinput.text(), verbose=False)
-            except: self.popup("Error", "err", "Failure", "Please Make Sure Parsing is Successful")
+        self.start_job("tree", lambda layout: self.show_tree(show_parse_tree, layout), parse_tree_layout, self.process)
 
-    def parse_tree_click(self):
-        try: draw_parse_tree(self.process[-1][1::], False)
+    def show_tree(self, show, layout):
+        try: show(layout)
         except: self.popup("Error", "err", "Failure", "Please Make Sure Parsing is Successful")
 
     def popup(self, title, msg_type,msg_title, msg_info, extra=""):
@@ -1029,5 +729,7 @@ if __name__ == "__main__":
     MainWindow = QtWidgets.QMainWindow()
     ui = Ui_MainWindow()
     ui.setupUi(MainWindow)
+    # jobs still running at exit must not report to a window that is gone
+    app.aboutToQuit.connect(lambda: [ui.cancel_job(name) for name in list(ui.jobs)])
     MainWindow.show()
     sys.exit(app.exec_())
\ No newline at end of file
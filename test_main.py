@@ -0,0 +1,46 @@
+import os
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+QtWidgets = pytest.importorskip("PyQt5.QtWidgets")
+from PyQt5 import QtGui
+
+import main
+from tiny_compiler import lex
+
+
+@pytest.fixture(scope="module")
+def ui():
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    window = QtWidgets.QMainWindow()
+    main.MainWindow = window
+    ui = main.Ui_MainWindow()
+    ui.setupUi(window)
+    yield ui
+    ui.pool.waitForDone()
+    window.close()
+
+
+def replace(ui, old, new):
+    '''Replaces the first old in the code with new through a text cursor, like typing would.'''
+    code = ui.codeinput.toPlainText()
+    start = code.index(old)
+    # Qt positions count UTF-16 code units
+    units = len(code[:start].encode("utf-16-le")) // 2
+    cursor = ui.codeinput.textCursor()
+    cursor.setPosition(units)
+    cursor.setPosition(units + len(old.encode("utf-16-le")) // 2, QtGui.QTextCursor.KeepAnchor)
+    cursor.insertText(new)
+
+
+def test_token_table_follows_edits_after_non_bmp_character(ui):
+    ui.codeinput.setPlainText("a && b # \U0001F600 note \U0001F600\U0001F600\U0001F600\U0001F600\nc || d\n")
+    replace(ui, "c", "count")
+    replace(ui, "||", "&&")
+    replace(ui, " d", " e <= 10 d")
+    replace(ui, "\U0001F600 ", "")
+    replace(ui, "a", "# \U0001F600\U0001F600\nx1 ")
+    code = ui.codeinput.toPlainText()
+    assert code == "# \U0001F600\U0001F600\nx1  && b # note \U0001F600\U0001F600\U0001F600\U0001F600\ncount && e <= 10 d\n"
+    assert list(ui.tokenmodel.tokens) == list(lex(code))
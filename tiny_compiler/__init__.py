@@ -0,0 +1,14 @@
+"""
+Core of the Tiny Language Compiler: the lexer, the LL(1) grammar and parser,
+and the DFA used to check token sequences.
+
+Nothing in here imports PyQt5, matplotlib or networkx, so the package can be
+used headless. ``python -m tiny_compiler --help`` lists the batch commands.
+"""
+from .lexer import Compiler, StreamToken, Token, TokenArray, TokenEdit, TERMINAL_OF_TYPE, get_input, lex, relex, stream, text_change
+from .grammar import Grammar, GrammarError, LL1Table
+from .parser import IncrementalParser, ParseNode, Parser, ParseTrace, GRAMMAR, PARSER, parse
+from .syntax_tree import Node, build_ast
+from .cache import ParseCache, PARSE_CACHE
+from .dfa import DFA, COMPILER_DFA, get_next_state, final_state, validate
+from .profiling import Profile, PROFILE
@@ -0,0 +1,215 @@
+"""
+Benchmarks of the lexer, parser, AST builder, tree construction and
+renderers over synthetic expressions of growing size and nesting.
+
+    python -m tiny_compiler bench -o baseline.json
+    python -m tiny_compiler bench --compare baseline.json
+
+Every benchmark is timed best of --repeat runs and then run once more under
+tracemalloc for its peak memory, so the timings are not slowed down by the
+tracing. Results are saved as JSON; comparing against an older file reports
+the ratio of every timing and fails past a threshold. Benchmarks that need
+NetworkX are skipped without it, and drawing is never done: the tree
+benchmarks stop at the positions show_ast and show_parse_tree would plot.
+"""
+import json
+import math
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+
+from .generator import ProgramGenerator
+from .layout import tree_layout
+from .lexer import Compiler, get_input, lex
+from .parser import PARSER, ParseTrace, parse
+from .render import render_ast, render_parse_tree
+from .syntax_tree import build_ast, to_networkx
+from .visualize import hierarchy_pos, parse_tree_graph
+
+# tokens per expression for the size curve, bracket depth for the nesting curve
+SIZES = (250, 2500, 25000)
+DEPTHS = (10, 100, 1000)
+
+
+def nested(depth):
+    '''(a0 && (a1 && ... (b) ...)) with depth pairs of brackets.'''
+    return "".join(f"(a{index} && " for index in range(depth)) + "b" + ")" * depth
+
+
+def cases(sizes=SIZES, depths=DEPTHS):
+    '''
+    Yields (curve, x, text): the size curve over token counts, programs from
+    a ProgramGenerator with a fixed seed, then the nesting curve.
+    '''
+    for size in sizes:
+        yield "size", size, ProgramGenerator(length=(size, size), max_depth=4, seed=size).program()
+    for depth in depths:
+        yield "depth", depth, nested(depth)
+
+
+def _traced(tokens):
+    trace = ParseTrace()
+    PARSER.parse(trace, tokens)
+    return trace
+
+
+def _ast_graph(tokens):
+    return to_networkx(build_ast(tokens))[0]
+
+
+def _ast_tree(tokens):
+    # what ast_layout does, without the layout cache
+    tree, labels = to_networkx(build_ast(tokens))
+    return tree_layout(tree)
+
+
+def _parse_tree(trace):
+    # what parse_tree_layout does, without the layout cache
+    tree, labels = parse_tree_graph(trace)
+    return tree_layout(tree)
+
+
+def _svg(render):
+    def run(input):
+        with open(os.devnull, "w", encoding="utf-8") as out:
+            render(input, out, "svg")
+    return run
+
+
+# name: (prepare, run, needs networkx). prepare turns the text into the input
+# of run outside the timing; run is what is measured.
+BENCHMARKS = {
+    "tokenize": (str, lambda text: list(Compiler().tokenize(text)), False),
+    "scan": (str, lex, False),
+    "get_input": (str, get_input, False),
+    "parse": (lex, lambda tokens: parse(None, tokens), False),
+    "parse traced": (lex, _traced, False),
+    "build_ast": (lex, build_ast, False),
+    "ast tree": (lex, _ast_tree, True),
+    "hierarchy_pos": (lambda text: _ast_graph(lex(text)), hierarchy_pos, True),
+    "parse tree": (lambda text: _traced(lex(text)), _parse_tree, True),
+    "svg ast": (lambda text: build_ast(lex(text)), _svg(render_ast), False),
+    "svg parse tree": (lambda text: _traced(lex(text)), _svg(render_parse_tree), False),
+}
+
+
+def measure(run, input, repeat):
+    '''Best time of repeat runs, and the peak memory of one more under tracemalloc.'''
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run(input)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        run(input)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def run_suite(names=None, sizes=SIZES, depths=DEPTHS, repeat=3, progress=None):
+    '''
+    Runs the named benchmarks (all by default) over cases(sizes, depths) and
+    returns the report: the environment and one result per benchmark and
+    case. progress, if given, is called with every result as it is done.
+    '''
+    try:
+        import networkx
+        have_networkx = True
+    except ImportError:
+        have_networkx = False
+    names = list(BENCHMARKS) if names is None else names
+    results = []
+    for curve, x, text in cases(sizes, depths):
+        tokens = len(lex(text))
+        for name in names:
+            prepare, run, needs_networkx = BENCHMARKS[name]
+            if needs_networkx and not have_networkx:
+                continue
+            seconds, peak = measure(run, prepare(text), repeat)
+            result = {"bench": name, "curve": curve, "x": x, "tokens": tokens, "seconds": seconds,
+                      "tokens_per_sec": tokens / seconds if seconds else None, "peak_bytes": peak}
+            results.append(result)
+            if progress:
+                progress(result)
+    return {"python": platform.python_version(), "platform": platform.platform(),
+            "commit": _commit(), "repeat": repeat, "results": results, "scaling": scaling(results)}
+
+
+def _commit():
+    try:
+        done = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)))
+    except OSError:
+        return None
+    return done.stdout.strip() or None
+
+
+def scaling(results):
+    '''
+    Growth exponent of every benchmark on every curve: the least squares
+    slope of log(seconds) over log(tokens), so 1 is linear and 2 quadratic.
+    '''
+    points = {}
+    for result in results:
+        if result["seconds"] > 0:
+            points.setdefault((result["bench"], result["curve"]), []).append(
+                (math.log(result["tokens"]), math.log(result["seconds"])))
+    exponents = {}
+    for (name, curve), xy in points.items():
+        if len(xy) < 2:
+            continue
+        mean_x = sum(x for x, y in xy) / len(xy)
+        mean_y = sum(y for x, y in xy) / len(xy)
+        spread = sum((x - mean_x) ** 2 for x, y in xy)
+        if spread:
+            slope = sum((x - mean_x) * (y - mean_y) for x, y in xy) / spread
+            exponents.setdefault(name, {})[curve] = round(slope, 2)
+    return exponents
+
+
+def compare(old, new, threshold=1.25):
+    '''
+    Pairs up the results of two reports by benchmark and case. Returns a
+    list of (result, old seconds, ratio) for every pair and the list of
+    those slower than threshold times the old timing.
+    '''
+    before = {(r["bench"], r["curve"], r["x"]): r["seconds"] for r in old["results"]}
+    rows = []
+    for result in new["results"]:
+        seconds = before.get((result["bench"], result["curve"], result["x"]))
+        if seconds:
+            rows.append((result, seconds, result["seconds"] / seconds))
+    return rows, [row for row in rows if row[2] > threshold]
+
+
+def format_result(result):
+    return (f"{result['bench']:<15} {result['curve']:<6}{result['x']:>7} {result['tokens']:>9} tokens "
+            f"{result['seconds'] * 1000:>10.2f} ms {result['tokens_per_sec'] or 0:>12,.0f} tok/s "
+            f"{result['peak_bytes'] / 1048576:>8.2f} MB")
+
+
+def format_report(report, rows=None):
+    '''The scaling exponents, and with rows from compare the timing ratios, as text.'''
+    lines = [f"python {report['python']} on {report['platform']}, commit {report['commit'] or '?'}"]
+    for name, curves in report["scaling"].items():
+        lines.append(f"{name:<15} grows as tokens^" + ", ".join(f"{e} ({curve})" for curve, e in curves.items()))
+    for result, seconds, ratio in rows or ():
+        lines.append(f"{result['bench']:<15} {result['curve']:<6}{result['x']:>7} "
+                     f"{seconds * 1000:>10.2f} -> {result['seconds'] * 1000:>10.2f} ms  x{ratio:.2f}")
+    return "\n".join(lines)
+
+
+def load(path):
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def save(report, path):
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=1)
+        file.write("\n")
@@ -0,0 +1,259 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from .lexer import TokenArray, lex
+from .syntax_tree import build_ast
+
+
+def cache_dir(*parts):
+    '''
+    Directory for files cached between runs, created if needed:
+    $XDG_CACHE_HOME/tiny_compiler (~/.cache/tiny_compiler by default).
+    '''
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    path = os.path.join(base, "tiny_compiler", *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def write_atomic(path, data):
+    '''
+    Writes bytes to path through a temporary file of its own, so readers
+    never see half a file and two writers of the same path don't collide.
+    '''
+    handle, temp = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(handle, "wb") as file:
+            file.write(data)
+        os.replace(temp, path)
+    except BaseException:
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+        raise
+
+
+class LayoutCache:
+    '''
+    Node positions of drawn trees, kept on disk as one JSON file per tree
+    hash under cache_dir("layouts"), so a tree that was laid out before,
+    even in an earlier session, is drawn without computing its layout
+    again. Reading a file touches it; once the files add up to more than
+    max_bytes the least recently used ones are deleted, down to 3/4 of it.
+    The directory is only listed for that: size is its total as of the
+    last listing plus what was written since, so it is listed again after
+    a quarter of max_bytes was written. A directory that can't be used
+    only makes every lookup a miss.
+    '''
+
+    def __init__(self, directory=None, max_bytes=32 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.size = None
+
+    @staticmethod
+    def key(kind, tree, labels):
+        '''Hash of a networkx tree: its kind, and every node's label and children in order.'''
+        digest = hashlib.blake2b(kind.encode(), digest_size=16)
+        for node in sorted(tree.nodes):
+            children = " ".join(map(str, tree.successors(node)))
+            digest.update(f"\n{node}\t{labels[node]}\t{children}".encode())
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory or cache_dir("layouts"), f"{key}.json")
+
+    def get(self, key):
+        '''The {node: (x, y)} positions stored under key, or None.'''
+        try:
+            path = self.path(key)
+            with open(path, "rb") as file:
+                positions = json.load(file)
+            os.utime(path)
+            return {node: (x, y) for node, x, y in positions}
+        except (OSError, ValueError, TypeError):
+            # unreadable, or not the JSON put() writes
+            return None
+
+    def put(self, key, pos):
+        data = json.dumps([[node, float(x), float(y)] for node, (x, y) in pos.items()]).encode()
+        try:
+            write_atomic(self.path(key), data)
+        except OSError:
+            return
+        if self.size is None:
+            self.evict()
+        else:
+            self.size += len(data)
+            if self.size > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        '''Lists the directory and, past max_bytes, deletes the oldest files down to 3/4 of it.'''
+        try:
+            entries = list(os.scandir(self.directory or cache_dir("layouts")))
+        except OSError:
+            return
+        files = []
+        for entry in entries:
+            if entry.name.endswith(".json"):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue  # deleted by another process meanwhile
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        if total > self.max_bytes:
+            files.sort()
+            for _, size, path in files:
+                if total <= self.max_bytes * 3 // 4:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                total -= size
+        self.size = total
+
+
+class ParseEntry:
+    '''
+    What parsing one token stream gives: the result of Parser.parse, its
+    ParseTrace and, for accepted inputs, the AST. The trace and the AST are
+    built on first use, a plain parse is several times faster than a traced
+    one. cache is the ParseCache holding the entry, told when the trace
+    grows it.
+    '''
+
+    __slots__ = ("tokens", "result", "_trace", "_ast", "cache")
+
+    def __init__(self, tokens, result, trace=None):
+        self.tokens = tokens
+        self.result = result
+        self._trace = trace
+        self._ast = None
+        self.cache = None
+
+    @property
+    def trace(self):
+        if self._trace is None:
+            from .parser import PARSER, ParseTrace
+            trace = ParseTrace()
+            PARSER.parse(trace, self.tokens)
+            self._trace = trace
+            if self.cache is not None:
+                self.cache.resize(self)
+        return self._trace
+
+    @property
+    def ast(self):
+        if self._ast is None and self.result is True:
+            self._ast = build_ast(self.tokens)
+        return self._ast
+
+    @property
+    def size(self):
+        return len(self.tokens) + (len(self._trace) if self._trace is not None else 0)
+
+
+class ParseCache:
+    '''
+    Bounded LRU cache of parses, keyed by a hash of the token stream: the
+    types and values of the tokens, so whitespace and comments don't make
+    a difference. At most max_entries are kept, and at most max_size tokens
+    plus trace steps in all, traces counted from when they are built; the
+    least recently used entries go first.
+    hits and misses count the lookups. Safe to share between threads.
+    '''
+
+    def __init__(self, max_entries=256, max_size=2_000_000):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def key(tokens):
+        text = tokens.text
+        digest = hashlib.blake2b(tokens.types.tobytes(), digest_size=16)
+        digest.update("\0".join(map(text.__getitem__, map(slice, tokens.starts, tokens.ends))).encode())
+        return digest.hexdigest()
+
+    def get(self, input, trace=False):
+        '''
+        The ParseEntry of an input, given as text or as a TokenArray, parsed
+        with PARSER on a miss. With trace=True its trace is built right away,
+        so it is not left to whoever reads it first (the GUI thread).
+        Text that doesn't lex gets an uncached entry with no tokens and
+        result "err", the same as parse().
+        '''
+        from .parser import PARSER, ParseTrace
+        if not isinstance(input, TokenArray):
+            try:
+                input = lex(input)
+            except ValueError:
+                return ParseEntry(None, "err", ParseTrace())
+        key = self.key(input)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if entry is not None:
+            entry = entry[0]
+            if trace:
+                entry.trace  # built here if it wasn't yet
+            return entry
+        if trace:
+            steps = ParseTrace()
+            entry = ParseEntry(input, PARSER.parse(steps, input), steps)
+        else:
+            entry = ParseEntry(input, PARSER.parse(None, input))
+        with self._lock:
+            if key not in self._entries:
+                # the size is kept so the same amount is taken off again
+                self._entries[key] = (entry, entry.size)
+                self.size += entry.size
+                entry.cache = self
+                self._evict()
+        return entry
+
+    def resize(self, entry):
+        '''Accounts for the trace of a cached entry built after it was stored.'''
+        key = self.key(entry.tokens)
+        with self._lock:
+            stored = self._entries.get(key)
+            if stored is None or stored[0] is not entry:
+                return
+            self._entries[key] = (entry, entry.size)
+            self.size += entry.size - stored[1]
+            self._evict()
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self.size > self.max_size):
+            self.size -= self._entries.popitem(last=False)[1][1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries), "size": self.size}
+
+
+# Shared by the GUI and the batch commands
+PARSE_CACHE = ParseCache()
+LAYOUT_CACHE = LayoutCache()
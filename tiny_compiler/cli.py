@@ -0,0 +1,328 @@
+"""
+Headless batch front end.
+
+    python -m tiny_compiler lex  [paths...|-] [--stream]
+    python -m tiny_compiler parse [paths...|-]
+    python -m tiny_compiler render [paths...|-] -d DIR [--tree ast|parse] [--format svg|dot|png|pdf]
+    python -m tiny_compiler bench [-o results.json] [--compare baseline.json]
+    python -m tiny_compiler generate [--count N] [--length MIN,MAX] [--error-rate R]
+    python -m tiny_compiler fuzz [--count N] [--error-rate R]
+
+Each path may be a file or a directory (walked recursively); ``-`` reads
+stdin. Results are written as JSON Lines, one record per input; a file that
+can't be read or isn't UTF-8 gets an error record and the rest go on. The
+exit status is 1 if any input failed to read, lex or parse. render writes
+one drawing per accepted input into DIR, numbered in input order, and
+records its file.
+lex --stream tokenizes every file in chunks instead of reading it whole and
+records only the DFA result and the token count.
+bench runs the benchmarks of tiny_compiler.bench instead of reading inputs;
+its exit status is 1 if a timing regressed against --compare. generate
+writes random programs one per line, fuzz checks the DFA against the parser
+on them and exits with 1 if they disagree.
+"""
+import argparse
+import fnmatch
+import json
+import os
+import sys
+
+from .cache import PARSE_CACHE
+from .lexer import Compiler, stream
+from .dfa import COMPILER_DFA, NUMBER_OR_ID, START, STATE_NAMES, validate
+from .profiling import PROFILE
+from .render import FORMATS, render_ast, render_parse_tree
+
+
+def iter_paths(paths, pattern="*"):
+    '''Yields every file under the given paths, directories walked in sorted order.'''
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for file in sorted(files):
+                    if fnmatch.fnmatch(file, pattern):
+                        yield os.path.join(root, file)
+        else:
+            yield path
+
+
+def iter_sources(paths, pattern="*"):
+    '''
+    Yields (name, text) for every file under the given paths, "-" being
+    stdin. A file that can't be read or decoded gives an error record as
+    its text instead, so the others still get done.
+    '''
+    for path in iter_paths(paths, pattern):
+        name = "<stdin>" if path == "-" else path
+        try:
+            text = sys.stdin.read() if path == "-" else read_file(path)
+        except (OSError, UnicodeDecodeError) as e:
+            text = error_record(e)
+        yield name, text
+
+
+def read_file(path):
+    with open(path, encoding="utf-8") as file:
+        return file.read()
+
+
+def error_record(error):
+    return {"ok": False, "error": f"{type(error).__name__}: {error}"}
+
+
+def iter_inputs(sources, by_line=False):
+    '''
+    Splits sources into single inputs: whole files, or one input per
+    non-empty line. Error records of unreadable sources are passed on.
+    '''
+    for name, text in sources:
+        if not by_line or isinstance(text, dict):
+            yield name, None, text
+            continue
+        for lineno, line in enumerate(text.splitlines(), 1):
+            if line.strip():
+                yield name, lineno, line
+
+
+def lex_record(text, with_tokens=True):
+    try:
+        tokens = Compiler().scan(text)
+    except ValueError as e:
+        return {"ok": False, "error": str(e)}
+    state = validate(tokens)
+    record = {"ok": state == NUMBER_OR_ID, "state": STATE_NAMES[state]}
+    if with_tokens:
+        record["tokens"] = [list(tok) for tok in tokens]
+    return record
+
+
+def stream_record(file):
+    '''lex_record of a whole file, tokenized in chunks and checked token by token.'''
+    rows = COMPILER_DFA.rows
+    codes = {name: code for code, name in enumerate(COMPILER_DFA.names)}
+    state = START
+    count = 0
+    try:
+        for token in stream(file):
+            state = rows[state][codes[token.type]]
+            count += 1
+    except UnicodeDecodeError as e:
+        return error_record(e)
+    except ValueError as e:
+        return {"ok": False, "error": str(e)}
+    return {"ok": state == NUMBER_OR_ID, "state": STATE_NAMES[state], "token_count": count}
+
+
+def iter_streamed(paths, pattern="*"):
+    '''Yields (name, None, record) of stream_record for every file, "-" being stdin.'''
+    for path in iter_paths(paths, pattern):
+        try:
+            if path == "-":
+                record = stream_record(sys.stdin.buffer)
+            else:
+                with open(path, "rb") as file:
+                    record = stream_record(file)
+        except OSError as e:
+            record = error_record(e)
+        yield "<stdin>" if path == "-" else path, None, record
+
+
+def parse_record(text, with_trace=False):
+    entry = PARSE_CACHE.get(text)
+    if entry.result == "err":
+        return {"ok": False, "error": "Input doesn't belong to the grammar's alphabet"}
+    record = {"ok": entry.result}
+    if with_trace:
+        record["steps"] = len(entry.trace)
+        record["moves"] = entry.trace.moves()
+    return record
+
+
+def render_record(text, path, tree="ast", format="svg"):
+    entry = PARSE_CACHE.get(text)
+    if entry.result == "err":
+        return {"ok": False, "error": "Input doesn't belong to the grammar's alphabet"}
+    if entry.result is not True:
+        return {"ok": False, "error": "Input is rejected by the parser"}
+    if tree == "ast":
+        render_ast(entry.ast, path, format)
+    else:
+        render_parse_tree(entry.trace, path, format)
+    return {"ok": True, "file": path}
+
+
+def int_list(text):
+    return tuple(int(part) for part in text.split(",") if part)
+
+
+def run_bench(args):
+    from . import bench
+    report = bench.run_suite(args.only, args.sizes, args.depths, args.repeat,
+                             lambda result: print(bench.format_result(result), flush=True))
+    rows = slower = None
+    if args.compare:
+        rows, slower = bench.compare(bench.load(args.compare), report, args.threshold)
+    print(bench.format_report(report, rows))
+    if args.output:
+        bench.save(report, args.output)
+    if slower:
+        print(f"{len(slower)} timings are more than {args.threshold}x slower than {args.compare}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def weights(text):
+    '''Parses "&&=3,||=1" into {"&&": 3.0, "||": 1.0}.'''
+    pairs = (part.rpartition("=") for part in text.split(",") if part)
+    return {terminal: float(weight) for terminal, _, weight in pairs}
+
+
+def program_generator(args):
+    from .generator import ProgramGenerator
+    return ProgramGenerator(length=args.length, max_depth=args.max_depth, operators=args.operators,
+                            error_rate=args.error_rate, seed=args.seed)
+
+
+def run_generate(args):
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        for program in program_generator(args).programs(args.count):
+            out.write(program)
+            out.write("\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+def run_fuzz(args):
+    from .generator import fuzz
+    counts, disagreements = fuzz(program_generator(args).programs(args.count), args.limit, args.step)
+    for program, state, result in disagreements:
+        print(json.dumps({"program": program, "dfa": state, "parser": result}))
+    print(json.dumps(counts), file=sys.stderr)
+    return 1 if counts["disagreements"] else 0
+
+
+def build_argparser():
+    argparser = argparse.ArgumentParser(prog="python -m tiny_compiler",
+                                        description="Batch lexing and LL(1) parsing of Tiny programs.")
+    commands = argparser.add_subparsers(dest="command", required=True)
+    for name, summary in (("lex", "tokenize inputs and run the DFA check"),
+                       ("parse", "run the LL(1) parser over inputs"),
+                       ("render", "draw the AST or parse tree of every input to a file")):
+        command = commands.add_parser(name, help=summary)
+        command.add_argument("paths", nargs="*", default=["-"],
+                             help="files or directories to read, - for stdin (default)")
+        command.add_argument("--glob", default="*",
+                             help="file name pattern used when walking directories (default: *)")
+        command.add_argument("--lines", action="store_true",
+                             help="treat every non-empty line as a separate input")
+        command.add_argument("-o", "--output", default="-",
+                             help="where to write the JSON Lines results (default: stdout)")
+        command.add_argument("--profile", action="store_true",
+                             help="print the time spent in every stage and the token and node counts to stderr")
+        command.add_argument("--cprofile", metavar="FILE",
+                             help="also capture a cProfile of the run and write its stats to FILE")
+    commands.choices["lex"].add_argument("--no-tokens", action="store_true",
+                                         help="only report the DFA result, not the token list")
+    commands.choices["lex"].add_argument("--stream", action="store_true",
+                                         help="read every file in chunks and report only the DFA result and "
+                                              "token count, for inputs too big to hold in memory")
+    commands.choices["parse"].add_argument("--trace", action="store_true",
+                                           help="include the list of parser moves")
+    commands.choices["parse"].add_argument("--cache-stats", action="store_true",
+                                           help="print the parse cache hits and misses to stderr")
+    commands.choices["render"].add_argument("-d", "--directory", default="trees",
+                                            help="directory to write the drawings to (default: trees)")
+    commands.choices["render"].add_argument("--tree", choices=("ast", "parse"), default="ast",
+                                            help="which tree to draw (default: ast)")
+    commands.choices["render"].add_argument("-f", "--format", choices=FORMATS, default="svg",
+                                            help="file format of the drawings (default: svg)")
+    from .bench import BENCHMARKS, DEPTHS, SIZES
+    command = commands.add_parser("bench", help="time the lexer, parser and tree builders on synthetic inputs")
+    command.add_argument("--only", action="append", choices=list(BENCHMARKS),
+                         help="run only this benchmark (may be repeated)")
+    command.add_argument("--sizes", type=int_list, default=SIZES,
+                         help="operand counts of the size curve, comma separated (default: %(default)s)")
+    command.add_argument("--depths", type=int_list, default=DEPTHS,
+                         help="bracket depths of the nesting curve, comma separated (default: %(default)s)")
+    command.add_argument("--repeat", type=int, default=3,
+                         help="runs per timing, the best is kept (default: 3)")
+    command.add_argument("-o", "--output", help="save the results as JSON to this file")
+    command.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    command.add_argument("--threshold", type=float, default=1.25,
+                         help="slowdown ratio that counts as a regression (default: 1.25)")
+    for name, summary, number in (("generate", "write random programs of the grammar, one per line", 10),
+                                  ("fuzz", "check the DFA against the parser on random programs", 100000)):
+        command = commands.add_parser(name, help=summary)
+        command.add_argument("--count", type=int, default=number,
+                             help=f"number of programs (default: {number})")
+        command.add_argument("--length", type=int_list, default=(1, 40),
+                             help="shortest and longest target token count, comma separated (default: 1,40)")
+        command.add_argument("--max-depth", type=int, default=3,
+                             help="deepest bracket nesting (default: 3)")
+        command.add_argument("--operators", type=weights, default=None,
+                             help='weights of the alternatives starting with a terminal, like "&&=3,(=0" (default: all 1)')
+        command.add_argument("--error-rate", type=float, default=0.0,
+                             help="share of programs that get one random edit (default: 0)")
+        command.add_argument("--seed", type=int, help="random seed, for a reproducible run")
+    commands.choices["generate"].add_argument("-o", "--output", default="-",
+                                              help="where to write the programs (default: stdout)")
+    commands.choices["fuzz"].add_argument("--limit", type=int, default=20,
+                                          help="most disagreements to print (default: 20)")
+    commands.choices["fuzz"].add_argument("--step", action="store_true",
+                                          help="also walk get_next_state and check the DFA table against it")
+    return argparser
+
+
+def main(argv=None):
+    args = build_argparser().parse_args(argv)
+    if args.command == "bench":
+        return run_bench(args)
+    if args.command == "generate":
+        return run_generate(args)
+    if args.command == "fuzz":
+        return run_fuzz(args)
+    if args.command == "lex" and args.stream and args.lines:
+        print("--stream reads whole files, it cannot be combined with --lines", file=sys.stderr)
+        return 2
+    if args.profile or args.cprofile:
+        PROFILE.enable(cprofile=bool(args.cprofile))
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    failed = 0
+    if args.command == "render":
+        os.makedirs(args.directory, exist_ok=True)
+    try:
+        if args.command == "lex" and args.stream:
+            inputs = iter_streamed(args.paths, args.glob)
+        else:
+            inputs = iter_inputs(iter_sources(args.paths, args.glob), args.lines)
+        for number, (name, lineno, text) in enumerate(inputs, 1):
+            if isinstance(text, dict):
+                # streamed, or a file that couldn't be read
+                record = text
+            elif args.command == "lex":
+                record = lex_record(text, not args.no_tokens)
+            elif args.command == "parse":
+                record = parse_record(text, args.trace)
+            else:
+                path = os.path.join(args.directory, f"{number:06d}.{args.format}")
+                record = render_record(text, path, args.tree, args.format)
+            record = {"source": name, "line": lineno, **record}
+            if not record["ok"]:
+                failed += 1
+            out.write(json.dumps(record))
+            out.write("\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    if args.command == "parse" and args.cache_stats:
+        print(json.dumps(PARSE_CACHE.stats()), file=sys.stderr)
+    if PROFILE.enabled:
+        PROFILE.disable()
+        print(PROFILE.format(), file=sys.stderr)
+        if args.cprofile:
+            PROFILE.dump_stats(args.cprofile)
+    return 1 if failed else 0
@@ -0,0 +1,162 @@
+from array import array
+from .lexer import COMPILER_SCANNER, TokenArray
+from .profiling import timed
+
+
+START, NUMBER_OR_ID, IN_OPERATION, FAILED = range(4)
+STATE_NAMES = ("START", "NUMBER_OR_ID", "IN_OPERATION", "FAILED")
+
+OPERANDS = ("ID", "NUMBER")
+OPERATORS = ("EQ", "LE", "LT", "GE", "GT", "NE", "OPERATION_AND", "OPERATION_OR")
+# Brackets are not part of the automaton, the compile page steps over them
+SKIPPED = ("OPEN_BRACKET", "CLOSED_BRACKET")
+
+# state -> {token type: next state}, anything missing goes to FAILED
+TRANSITIONS = {
+    START: {**dict.fromkeys(OPERANDS, NUMBER_OR_ID), "OPERATION_NOT": IN_OPERATION},
+    NUMBER_OR_ID: dict.fromkeys(OPERATORS, IN_OPERATION),
+    IN_OPERATION: {**dict.fromkeys(OPERANDS, NUMBER_OR_ID), "OPERATION_NOT": IN_OPERATION},
+    FAILED: {},
+}
+
+
+class DFA:
+    '''
+    The compile page automaton as a transition table. States are the
+    integers above and rows[state] is a bytes row indexed by token type code,
+    codes being positions in names (the names of a Scanner). Skipped tokens
+    and the padding code len(names) leave the state unchanged, the code
+    len(names) + 1 stands for any unknown type and always fails.
+    '''
+
+    def __init__(self, names):
+        self.names = tuple(names)
+        self.pad = len(self.names)
+        self.unknown = self.pad + 1
+        rows = []
+        for state in range(len(STATE_NAMES)):
+            row = bytearray([FAILED]) * (self.unknown + 1)
+            for code, name in enumerate(self.names):
+                if name in SKIPPED:
+                    row[code] = state
+                else:
+                    row[code] = TRANSITIONS[state].get(name, FAILED)
+            row[self.pad] = state
+            rows.append(bytes(row))
+        self.rows = tuple(rows)
+
+    def encode(self, token_types):
+        '''Maps token type names to codes.'''
+        codes = {name: code for code, name in enumerate(self.names)}
+        return array('B', [codes.get(name, self.unknown) for name in token_types])
+
+    def _codes(self, tokens):
+        if isinstance(tokens, TokenArray):
+            if tokens.names != self.names:
+                raise ValueError("TokenArray comes from a scanner with other token types")
+            return tokens.types
+        return tokens
+
+    @timed("dfa")
+    def validate(self, tokens):
+        '''Final state after a TokenArray, or a sequence of type codes.'''
+        rows = self.rows
+        state = START
+        for code in self._codes(tokens):
+            state = rows[state][code]
+            if state == FAILED:
+                break
+        return state
+
+    def accepts(self, tokens):
+        return self.validate(tokens) == NUMBER_OR_ID
+
+    @timed("dfa")
+    def run(self, tokens):
+        '''State after every token, as an array of state ids.'''
+        rows = self.rows
+        states = array('B')
+        add = states.append
+        state = START
+        for code in self._codes(tokens):
+            state = rows[state][code]
+            add(state)
+        return states
+
+    @timed("dfa")
+    def rerun(self, tokens, states, first, removed, added):
+        '''
+        Updates states, the output of run, after tokens[first:first + removed]
+        were replaced by added new ones. The states are recomputed from first
+        only until they fall back in step with the old ones. Returns the index
+        after the last state that changed.
+        '''
+        rows = self.rows
+        codes = self._codes(tokens)
+        state = states[first - 1] if first else START
+        new = array('B')
+        for index in range(first, first + added):
+            state = rows[state][codes[index]]
+            new.append(state)
+        index = first + added
+        old = first + removed
+        while index < len(codes):
+            state = rows[state][codes[index]]
+            if state == states[old]:
+                break
+            new.append(state)
+            index += 1
+            old += 1
+        states[first:old] = new
+        return first + len(new)
+
+    @timed("dfa")
+    def validate_batch(self, streams):
+        '''
+        Final state of every stream in a list of TokenArrays or code
+        sequences. With NumPy installed the streams are padded into one
+        matrix and advanced a column at a time; otherwise they are run one
+        after the other.
+        '''
+        streams = [self._codes(stream) for stream in streams]
+        try:
+            import numpy
+        except ImportError:
+            return array('B', [self.validate(stream) for stream in streams])
+        # one column of codes per token position, one stream per entry
+        lengths = numpy.fromiter((len(stream) for stream in streams), dtype=numpy.intp, count=len(streams))
+        flat = numpy.frombuffer(b"".join(bytes(stream) for stream in streams), dtype=numpy.uint8)
+        codes = numpy.full((int(lengths.max(initial=0)), len(streams)), self.pad, dtype=numpy.intp)
+        positions = numpy.arange(len(flat)) - numpy.repeat(numpy.cumsum(lengths) - lengths, lengths)
+        codes[positions, numpy.repeat(numpy.arange(len(streams)), lengths)] = flat
+        width = len(self.rows[0])
+        table = numpy.frombuffer(b"".join(self.rows), dtype=numpy.uint8).astype(numpy.intp)
+        states = numpy.full(len(streams), START, dtype=numpy.intp)
+        for column in codes:
+            states = table[states * width + column]
+        return array('B', states.astype(numpy.uint8).tobytes())
+
+
+COMPILER_DFA = DFA(COMPILER_SCANNER.names)
+
+
+def validate(tokens):
+    '''Final state id of the DFA after a TokenArray from Compiler.scan.'''
+    return COMPILER_DFA.validate(tokens)
+
+
+def get_next_state(token, current_state):
+    '''One transition by name, kept for callers that step a token at a time.'''
+    state = STATE_NAMES.index(current_state)
+    return STATE_NAMES[TRANSITIONS[state].get(token, FAILED)]
+
+
+def final_state(token_types):
+    '''
+    Runs the DFA over a sequence of token type names, or a TokenArray, and
+    returns the name of the state it ends in. Brackets are skipped, same as
+    the token table on the compile page.
+    '''
+    if not isinstance(token_types, TokenArray):
+        token_types = COMPILER_DFA.encode(token_types)
+    return STATE_NAMES[COMPILER_DFA.validate(token_types)]
@@ -0,0 +1,213 @@
+"""
+Random programs from the grammar, for load and fuzz testing: derivations of
+the parser's productions with random choices, written out with lexemes the
+Compiler accepts, and optionally broken by one random edit. Everything is
+generated lazily, so a single program of millions of tokens or an endless
+stream of small ones costs no memory.
+
+fuzz() runs generated programs through the DFA check of the compile page
+and through the parser and reports where they disagree.
+"""
+import random
+from itertools import count
+
+from .dfa import COMPILER_DFA, NUMBER_OR_ID, STATE_NAMES, get_next_state
+from .lexer import TERMINAL_OF_TYPE, lex
+from .parser import GRAMMAR, PARSER
+
+IDENTIFIER = TERMINAL_OF_TYPE["ID"]
+# characters no token starts with, for errors the lexer has to catch
+BAD_CHARACTERS = "$@=&|%"
+MUTATIONS = ("delete", "replace", "insert", "garble")
+
+
+class ProgramGenerator:
+    '''
+    Generates random programs of a Grammar (the parser's by default).
+
+    length: (shortest, longest) target number of tokens, one target is drawn
+    per program. While under it the derivation keeps growing, and once the
+    shortest completion would reach it the cheapest alternatives are taken,
+    so programs end within a few tokens of the target.
+    max_depth: how deep the start symbol may nest in itself, in Tiny the
+    bracket depth.
+    operators: {terminal: weight} for the alternatives starting with that
+    terminal (or a variable that does), 1 for any terminal left out; a
+    weight of 0 never picks it, even if the program then ends short of its
+    target. empty_weight is the weight of an empty alternative while the
+    target is not reached.
+    error_rate: share of programs that get one random edit: a token deleted,
+    replaced or inserted, or a character the lexer rejects. Edited programs
+    may still happen to be valid.
+    '''
+
+    def __init__(self, grammar=None, length=(1, 40), max_depth=3, operators=None,
+                 error_rate=0.0, empty_weight=0.25, seed=None):
+        self.grammar = grammar or GRAMMAR
+        self.length = length
+        self.max_depth = max_depth
+        self.operators = operators or {}
+        self.error_rate = error_rate
+        self.empty_weight = empty_weight
+        self.rng = random.Random(seed)
+        self.start = self.grammar.start
+        self.terminals = [terminal for terminal in self.grammar.terminals if terminal]
+        self.alternatives = {variable: [tuple(rhs.split()) for rhs in alternatives]
+                             for variable, alternatives in self.grammar.productions.items()}
+        self.cost = self._costs()
+        self._weights = {}
+        # (body, shortest yield, weight, nests the start symbol) per alternative
+        self.choices = {variable: [(body, sum(self.cost[symbol] for symbol in body), self._weight(body),
+                                    self.start in body) for body in bodies]
+                        for variable, bodies in self.alternatives.items()}
+
+    def _costs(self):
+        # length of the shortest string every symbol derives, to a fixed point
+        cost = {terminal: 1 for terminal in self.terminals}
+        cost.update(dict.fromkeys(self.alternatives, float("inf")))
+        changed = True
+        while changed:
+            changed = False
+            for variable, bodies in self.alternatives.items():
+                best = min(sum(cost[symbol] for symbol in body) for body in bodies)
+                if best < cost[variable]:
+                    cost[variable] = best
+                    changed = True
+        return cost
+
+    def _weight(self, body):
+        if not body:
+            return self.empty_weight
+        first = body[0]
+        if first not in self.alternatives:
+            return self.operators.get(first, 1.0)
+        if first not in self._weights:
+            # a variable weighs the mean of its alternatives (the grammar is LL(1), so this ends)
+            bodies = [body for body in self.alternatives[first] if body]
+            self._weights[first] = sum(self._weight(body) for body in bodies) / len(bodies)
+        return self._weights[first]
+
+    def derive(self, target):
+        '''Yields the terminals of one random derivation of about target tokens.'''
+        rng = self.rng
+        cost = self.cost
+        stack = [(self.start, 0)]
+        pending = cost[self.start]
+        emitted = 0
+        variables = 1  # on the stack
+        while stack:
+            symbol, depth = stack.pop()
+            if symbol not in self.choices:
+                pending -= 1
+                emitted += 1
+                yield symbol
+                continue
+            pending -= cost[symbol]
+            variables -= 1
+            choices = self.choices[symbol]
+            if depth >= self.max_depth:
+                choices = [choice for choice in choices if not choice[3]] or choices
+            # a weight of 0 is never picked, the empty alternative always ends a program
+            choices = [choice for choice in choices if choice[2] > 0 or not choice[0]] or choices
+            if emitted + pending + cost[symbol] >= target:
+                body = min(choices, key=lambda choice: choice[1])[0]
+            else:
+                if not variables:
+                    # the last variable left must not end the program early, unless
+                    # nothing else may be picked
+                    choices = [choice for choice in choices if choice[0] and choice[2] > 0] or choices
+                weights = [choice[2] for choice in choices]
+                if sum(weights) > 0:
+                    body = rng.choices(choices, weights)[0][0]
+                else:
+                    body = min(choices, key=lambda choice: choice[1])[0]
+            for below in reversed(body):
+                stack.append((below, depth + 1 if below == self.start else depth))
+                pending += cost[below]
+                variables += below in self.choices
+
+    def lexeme(self, terminal):
+        '''Text for a terminal: a name or a number for identifiers, the terminal itself otherwise.'''
+        if terminal != IDENTIFIER:
+            return terminal
+        if self.rng.random() < 0.8:
+            return self.rng.choice("abcxyz") + str(self.rng.randrange(100))
+        return str(self.rng.randrange(1000))
+
+    def _mutate(self, terminal):
+        kind = self.rng.choice(MUTATIONS)
+        if kind == "garble":
+            return [self.rng.choice(BAD_CHARACTERS)]
+        if kind == "delete" and terminal is not None:
+            return []
+        new = self.lexeme(self.rng.choice(self.terminals))
+        if kind == "insert" and terminal is not None:
+            return [new, self.lexeme(terminal)]
+        return [new]
+
+    def lexemes(self):
+        '''Yields the lexemes of one program, with its random edit if it gets one.'''
+        target = self.rng.randint(*self.length)
+        at = self.rng.randrange(max(target, 1)) if self.rng.random() < self.error_rate else -1
+        index = -1
+        for index, terminal in enumerate(self.derive(target)):
+            if index == at:
+                yield from self._mutate(terminal)
+            else:
+                yield self.lexeme(terminal)
+        if index < at:
+            yield from self._mutate(None)
+
+    def program(self):
+        return " ".join(self.lexemes())
+
+    def programs(self, number=None):
+        '''Yields number programs, or programs forever if number is None.'''
+        for _ in (count() if number is None else range(number)):
+            yield self.program()
+
+
+def dfa_state(tokens):
+    '''State name get_next_state ends in over a TokenArray, brackets skipped as on the compile page.'''
+    state = "START"
+    names = tokens.names
+    for code in tokens.types:
+        name = names[code]
+        if name not in ("OPEN_BRACKET", "CLOSED_BRACKET"):
+            state = get_next_state(name, state)
+    return state
+
+
+def fuzz(programs, limit=20, step=False):
+    '''
+    Checks the DFA against the parser on every program and returns the
+    counts and up to limit disagreements as (program, DFA state, parse
+    result). On programs without brackets the two must agree, with brackets
+    everything the parser accepts must pass the DFA. The table DFA is used,
+    step=True walks get_next_state instead and checks the table against it.
+    '''
+    counts = dict.fromkeys(("programs", "lex errors", "accepted", "rejected", "bracketed", "disagreements"), 0)
+    disagreements = []
+    for program in programs:
+        counts["programs"] += 1
+        try:
+            tokens = lex(program)
+        except ValueError:
+            counts["lex errors"] += 1
+            continue
+        state = COMPILER_DFA.validate(tokens)
+        if step and dfa_state(tokens) != STATE_NAMES[state]:
+            raise AssertionError(f"get_next_state and the DFA table disagree on {program!r}")
+        result = PARSER.parse(None, tokens)
+        counts["accepted" if result is True else "rejected"] += 1
+        terminals = tokens.terminals()
+        if "(" in terminals or ")" in terminals:
+            counts["bracketed"] += 1
+            agree = result is not True or state == NUMBER_OR_ID
+        else:
+            agree = (result is True) == (state == NUMBER_OR_ID)
+        if not agree:
+            counts["disagreements"] += 1
+            if len(disagreements) < limit:
+                disagreements.append((program, STATE_NAMES[state], result))
+    return counts, disagreements
@@ -0,0 +1,293 @@
+import os
+from collections import namedtuple
+from types import MappingProxyType
+from .cache import cache_dir, write_atomic
+from .profiling import timed
+
+
+class GrammarError(ValueError):
+    pass
+
+
+Conflict = namedtuple("Conflict", "variable terminal productions")
+
+
+class Grammar():
+
+    def __init__(self, V=None, T=None, S=None, P=None):
+        if V:
+            self.variables = V
+        else:
+            self.variables = []
+
+        if S:
+            self.start = S
+        else:
+            self.start = ''
+
+        if T:
+            self.terminals = T
+        else:
+            self.terminals = []
+
+        if P:
+            self.productions = P
+        else:
+            self.productions = {}
+
+    def __str__(self):
+        '''Prints out G(V, T, S, P)'''
+        s = 'Grammar \n'
+        s = s + 'Start Symbol \n' + str(self.start) + '\n'
+        s = s + 'Terminals \n' + str(self.terminals) + '\n'
+        s = s + 'Variables \n' + str(self.variables) + '\n'
+        s = s + 'Productions \n' + str(self.productions) + '\n'
+        return s
+
+    @classmethod
+    def from_rules(cls, rules, start=None):
+        '''
+        Builds a grammar from rules written one variable per line, as in vars.txt:
+
+            exp' : || term exp' |
+
+        Symbols are separated by spaces, a lone | separates alternatives and an
+        empty alternative is ε. Every symbol that never appears on the left is
+        a terminal. The start symbol defaults to the first variable.
+        '''
+        productions = {}
+        for line in rules.splitlines():
+            if not line.strip():
+                continue
+            lhs, _, rhs = line.partition(" : ")
+            if not _:
+                raise GrammarError(f"Rule has no ' : ' separator: {line!r}")
+            alternatives = [[]]
+            for symbol in rhs.split():
+                if symbol == "|":
+                    alternatives.append([])
+                else:
+                    alternatives[-1].append(symbol)
+            productions.setdefault(lhs.strip(), []).extend(" ".join(symbols) for symbols in alternatives)
+        variables = list(productions)
+        terminals = []
+        for alternatives in productions.values():
+            for rhs in alternatives:
+                for symbol in rhs.split(" ") if rhs else [""]:
+                    if symbol not in productions and symbol not in terminals:
+                        terminals.append(symbol)
+        return cls(variables, terminals, start or variables[0], productions)
+
+    def fingerprint(self):
+        '''Hash of the start symbol and productions, used to key cached tables.'''
+        import hashlib
+        import json
+        spec = json.dumps([self.start, self.variables, self.productions], sort_keys=True)
+        return hashlib.sha256(spec.encode("utf-8")).hexdigest()
+
+    def _rules(self):
+        return [(lhs, rhs, rhs.split(" ") if rhs else []) for lhs in self.variables
+                for rhs in self.productions.get(lhs, [])]
+
+    def first_sets(self):
+        '''
+        FIRST of every symbol, "" marking the nullable variables. Computed with
+        a worklist: a variable is only revisited when the FIRST set of a
+        symbol it depends on grew.
+        '''
+        rules = self._rules()
+        variables = set(self.variables)
+        nullable = self._nullable(rules, variables)
+        first = {symbol: {symbol} for symbol in self.terminals}
+        first.update((variable, {""} if variable in nullable else set()) for variable in self.variables)
+        # users[B] = variables A with a rule A -> αBβ where α is nullable
+        users = {variable: set() for variable in self.variables}
+        for lhs, rhs, symbols in rules:
+            for symbol in symbols:
+                if symbol in variables:
+                    users[symbol].add(lhs)
+                else:
+                    first.setdefault(symbol, {symbol})
+                    first[lhs].add(symbol)
+                if symbol not in nullable:
+                    break
+        work = [variable for variable in self.variables if first[variable] - {""}]
+        pending = set(work)
+        while work:
+            symbol = work.pop()
+            pending.discard(symbol)
+            found = first[symbol] - {""}
+            for user in users[symbol]:
+                if not found <= first[user]:
+                    first[user] |= found
+                    if user not in pending:
+                        pending.add(user)
+                        work.append(user)
+        return first
+
+    def follow_sets(self, first=None):
+        '''FOLLOW of every variable, computed with the same worklist scheme as first_sets.'''
+        first = first or self.first_sets()
+        variables = set(self.variables)
+        follow = {variable: set() for variable in self.variables}
+        follow[self.start].add("$")
+        # feeds[A] = variables B with a rule A -> αBβ where β is nullable
+        feeds = {variable: set() for variable in self.variables}
+        for lhs, rhs, symbols in self._rules():
+            for index, symbol in enumerate(symbols):
+                if symbol not in variables:
+                    continue
+                rest = self.first_of(symbols[index + 1:], first)
+                follow[symbol] |= rest - {""}
+                if "" in rest and symbol != lhs:
+                    feeds[lhs].add(symbol)
+        work = list(self.variables)
+        pending = set(work)
+        while work:
+            symbol = work.pop()
+            pending.discard(symbol)
+            for fed in feeds[symbol]:
+                if not follow[symbol] <= follow[fed]:
+                    follow[fed] |= follow[symbol]
+                    if fed not in pending:
+                        pending.add(fed)
+                        work.append(fed)
+        return follow
+
+    @staticmethod
+    def first_of(symbols, first):
+        '''FIRST of a sequence of symbols, containing "" if all of them are nullable.'''
+        result = set()
+        for symbol in symbols:
+            result |= first[symbol] - {""}
+            if "" not in first[symbol]:
+                return result
+        result.add("")
+        return result
+
+    def build_table(self):
+        '''
+        Builds the LL(1) parsing table, {variable: {terminal: production}},
+        and returns it with the list of conflicts found. When two productions
+        compete for a cell, the first one in the grammar is kept.
+        '''
+        first = self.first_sets()
+        follow = self.follow_sets(first)
+        table = {variable: {} for variable in self.variables}
+        cells = {}
+        for lhs, rhs, symbols in self._rules():
+            lookahead = self.first_of(symbols, first)
+            if "" in lookahead:
+                lookahead = (lookahead - {""}) | follow[lhs]
+            for terminal in sorted(lookahead):
+                cell = cells.setdefault((lhs, terminal), [])
+                cell.append(rhs)
+                table[lhs].setdefault(terminal, rhs)
+        conflicts = [Conflict(variable, terminal, productions)
+                     for (variable, terminal), productions in cells.items() if len(productions) > 1]
+        return table, conflicts
+
+    def parsing_table(self):
+        '''The LL(1) parsing table, raising GrammarError if the grammar is not LL(1).'''
+        table, conflicts = self.build_table()
+        if conflicts:
+            raise GrammarError("Grammar is not LL(1): " + "; ".join(
+                f"{c.variable} on {c.terminal!r}: " + " / ".join(p or "ε" for p in c.productions)
+                for c in conflicts))
+        return table
+
+    def cached_parsing_table(self, directory=None):
+        '''
+        parsing_table(), stored as JSON under the cache directory keyed by
+        fingerprint() so large grammars are only analysed once.
+        '''
+        import json
+        path = os.path.join(directory or cache_dir("tables"), f"ll1-{self.fingerprint()}.json")
+        try:
+            with open(path, encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            pass
+        table = self.parsing_table()
+        write_atomic(path, json.dumps(table).encode("utf-8"))
+        return table
+
+    @staticmethod
+    def _nullable(rules, variables):
+        # remaining[i] counts the symbols of rule i not yet known to be nullable
+        remaining = []
+        uses = {variable: [] for variable in variables}
+        nullable = set()
+        work = []
+        for index, (lhs, rhs, symbols) in enumerate(rules):
+            remaining.append(len(symbols))
+            for symbol in symbols:
+                if symbol in uses:
+                    uses[symbol].append(index)
+            if not symbols and lhs not in nullable:
+                nullable.add(lhs)
+                work.append(lhs)
+        while work:
+            symbol = work.pop()
+            for index in uses[symbol]:
+                remaining[index] -= 1
+                lhs = rules[index][0]
+                if remaining[index] == 0 and lhs not in nullable:
+                    nullable.add(lhs)
+                    work.append(lhs)
+        return nullable
+
+
+class LL1Table(namedtuple("LL1Table", "symbols codes variable_count start productions pushes moves rows")):
+    '''
+    A parsing table compiled to integer codes, built once and never modified.
+
+    symbols: every symbol by code, variables first, then terminals, "$" last
+    codes: symbol -> code (read only)
+    variable_count: codes below it are variables
+    start: code of the start variable
+    productions: (lhs, rhs) per production, rhs being a tuple of codes
+    pushes: rhs of each production reversed, ready to extend the stack with
+    moves: each production written as in the parse table, e.g. "exp -> term exp'"
+    rows: rows[variable][terminal] is the production to expand, or -1
+
+    encode() maps terminals that are not in the grammar to len(symbols),
+    which has an all -1 column in rows and never matches a stack symbol.
+    '''
+    __slots__ = ()
+
+    @classmethod
+    @timed("table")
+    def compile(cls, grammar, table):
+        variables = tuple(grammar.variables)
+        terminals = tuple(t for t in grammar.terminals if t and t != '$') + ('$',)
+        symbols = variables + terminals
+        codes = {symbol: code for code, symbol in enumerate(symbols)}
+        width = len(symbols) + 1
+        index = {}
+        productions = []
+        moves = []
+        rows = []
+        for variable in variables:
+            row = [-1] * width
+            for terminal, rhs in table.get(variable, {}).items():
+                if (variable, rhs) not in index:
+                    index[variable, rhs] = len(productions)
+                    rhs_codes = tuple(codes[symbol] for symbol in rhs.split(" ")) if rhs else ()
+                    productions.append((codes[variable], rhs_codes))
+                    moves.append(f"{variable} -> {rhs or 'ε'}")
+                row[codes[terminal]] = index[variable, rhs]
+            rows.append(tuple(row))
+        return cls(symbols, MappingProxyType(codes), len(variables), codes[grammar.start], tuple(productions),
+                   tuple(rhs[::-1] for lhs, rhs in productions), tuple(moves), tuple(rows))
+
+    def encode(self, terminals):
+        '''Maps a list of terminal names to codes.'''
+        codes = self.codes
+        unknown = len(self.symbols)
+        variable_count = self.variable_count
+        encoded = []
+        for terminal in terminals:
+            code = codes.get(terminal, unknown)
+            encoded.append(code if code >= variable_count else unknown)
+        return encoded
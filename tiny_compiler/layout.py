@@ -0,0 +1,141 @@
+"""
+Tidy drawing of trees (Reingold-Tilford, in the linear time version of
+Buchheim, Junger and Leipert), used for the AST and the parse tree instead
+of Graphviz. Parents are centered over their children, subtrees are packed
+as close as they go without overlapping, and identical subtrees are drawn
+identically. Everything runs on explicit stacks, so deep trees are fine.
+"""
+from .profiling import PROFILE, timed
+
+
+@timed("layout")
+def tidy_layout(children, root, distance=1.0, level_gap=1.0):
+    '''
+    Positions of the nodes of a tree, given as a mapping of every node to
+    its children in drawing order (leaves may be left out).
+    Returns {node: (x, y)} with the root at y = 0 and every level level_gap
+    lower; neighbours on a level are at least distance apart.
+    '''
+    # number the nodes in preorder; everything below works on these numbers
+    nodes = []
+    kids = []
+    parent = []
+    number = []
+    stack = [(root, -1, 0)]
+    while stack:
+        node, up, position = stack.pop()
+        index = len(nodes)
+        nodes.append(node)
+        parent.append(up)
+        number.append(position)
+        kids.append([])
+        if up >= 0:
+            kids[up].append(index)
+        below = list(children.get(node, ()))
+        for position in range(len(below) - 1, -1, -1):
+            stack.append((below[position], index, position))
+    count = len(nodes)
+    prelim = [0.0] * count
+    mod = [0.0] * count
+    shift = [0.0] * count
+    change = [0.0] * count
+    thread = [-1] * count
+    ancestor = list(range(count))
+    default_ancestor = [first[0] if first else -1 for first in kids]
+
+    def next_left(v):
+        return kids[v][0] if kids[v] else thread[v]
+
+    def next_right(v):
+        return kids[v][-1] if kids[v] else thread[v]
+
+    def apportion(v, default):
+        # push the subtree of v right until it clears its left siblings, level by level
+        up = parent[v]
+        if number[v] == 0:
+            return default
+        inner_right = outer_right = v
+        inner_left = kids[up][number[v] - 1]
+        outer_left = kids[up][0]
+        sum_inner_right = mod[inner_right]
+        sum_outer_right = mod[outer_right]
+        sum_inner_left = mod[inner_left]
+        sum_outer_left = mod[outer_left]
+        while next_right(inner_left) >= 0 and next_left(inner_right) >= 0:
+            inner_left = next_right(inner_left)
+            inner_right = next_left(inner_right)
+            outer_left = next_left(outer_left)
+            outer_right = next_right(outer_right)
+            ancestor[outer_right] = v
+            gap = prelim[inner_left] + sum_inner_left - prelim[inner_right] - sum_inner_right + distance
+            if gap > 0:
+                left = ancestor[inner_left]
+                if parent[left] != up:
+                    left = default
+                subtrees = number[v] - number[left]
+                change[v] -= gap / subtrees
+                shift[v] += gap
+                change[left] += gap / subtrees
+                prelim[v] += gap
+                mod[v] += gap
+                sum_inner_right += gap
+                sum_outer_right += gap
+            sum_inner_left += mod[inner_left]
+            sum_inner_right += mod[inner_right]
+            sum_outer_left += mod[outer_left]
+            sum_outer_right += mod[outer_right]
+        if next_right(inner_left) >= 0 and next_right(outer_right) < 0:
+            thread[outer_right] = next_right(inner_left)
+            mod[outer_right] += sum_inner_left - sum_outer_right
+        if next_left(inner_right) >= 0 and next_left(outer_left) < 0:
+            thread[outer_left] = next_left(inner_right)
+            mod[outer_left] += sum_inner_right - sum_outer_left
+            default = v
+        return default
+
+    # first walk, in postorder with siblings left to right: a walk that
+    # takes the last child first, reversed
+    postorder = []
+    stack = [0]
+    while stack:
+        v = stack.pop()
+        postorder.append(v)
+        stack.extend(kids[v])
+    postorder.reverse()
+    for v in postorder:
+        below = kids[v]
+        left = kids[parent[v]][number[v] - 1] if parent[v] >= 0 and number[v] else -1
+        if below:
+            moved = total = 0.0
+            for w in reversed(below):
+                prelim[w] += moved
+                mod[w] += moved
+                total += change[w]
+                moved += shift[w] + total
+            middle = (prelim[below[0]] + prelim[below[-1]]) / 2
+            if left >= 0:
+                prelim[v] = prelim[left] + distance
+                mod[v] = prelim[v] - middle
+            else:
+                prelim[v] = middle
+        elif left >= 0:
+            prelim[v] = prelim[left] + distance
+        if parent[v] >= 0:
+            default_ancestor[parent[v]] = apportion(v, default_ancestor[parent[v]])
+
+    # second walk: add up the modifiers from the root down
+    pos = {}
+    stack = [(0, 0.0, 0)]
+    while stack:
+        v, offset, depth = stack.pop()
+        pos[nodes[v]] = (prelim[v] + offset, -depth * level_gap)
+        offset += mod[v]
+        for w in kids[v]:
+            stack.append((w, offset, depth + 1))
+    PROFILE.count("layout nodes", count)
+    return pos
+
+
+def tree_layout(tree, root=0, distance=1.0, level_gap=1.0):
+    '''tidy_layout of a networkx DiGraph, children in the order their edges were added.'''
+    return tidy_layout(tree.succ, root, distance, level_gap)
@@ -0,0 +1,415 @@
+import codecs
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from itertools import accumulate, count
+from operator import add
+from sly import Lexer
+from .profiling import PROFILE, timed
+
+
+class Compiler(Lexer):
+    tokens = {NUMBER, ID,
+              EQ, LT, LE, GT, GE, NE, OPERATION_AND, OPERATION_OR, OPERATION_NOT, OPEN_BRACKET, CLOSED_BRACKET}
+    ignore = ' \t'
+    OPEN_BRACKET = r'[(]'
+    CLOSED_BRACKET = r'[)]'
+    EQ = r'=='
+    LE = r'<='
+    LT = r'<'
+    GE = r'>='
+    GT = r'>'
+    NE = r'!='
+    ID = r'[a-zA-Z_][a-zA-Z0-9_]*'
+    ignore_comment = r'\#.*'
+    OPERATION_AND = r'[&][&]'
+    OPERATION_OR = r'[|][|]'
+    OPERATION_NOT = r'!'
+
+    @_(r'\d+')
+    def NUMBER(self, t):
+        t.value = int(t.value)
+        return t
+
+    @_(r'\n+')
+    def ignore_newline(self, t):
+        self.lineno += t.value.count('\n')
+
+    def error(self, t):
+        raise ValueError('Line %d: Bad character %r' % (self.lineno, t.value[0]))
+        self.index += 1
+
+    def scan(self, text, lineno=1):
+        '''
+        Same tokens as tokenize(), produced in one pass into a TokenArray.
+        This is the token stream shared by the parser, the DFA check and the
+        AST, see TERMINAL_OF_TYPE for how it maps onto the grammar.
+        '''
+        return COMPILER_SCANNER.scan(text, lineno)
+
+    def stream(self, file, chunk_size=1 << 16, lineno=1):
+        '''Same tokens as scan(), read lazily from a file object or mmap, see Scanner.stream.'''
+        return COMPILER_SCANNER.stream(file, chunk_size, lineno)
+
+
+Token = namedtuple("Token", "type value lineno index")
+# a Token from Scanner.stream, with the column (from 1) of its first character
+StreamToken = namedtuple("StreamToken", "type value lineno index column")
+# tokens[first:first + removed] are replaced by the new types, starts and
+# ends, and every token after them moves by delta characters
+TokenEdit = namedtuple("TokenEdit", "first removed types starts ends delta text")
+
+
+class TokenArray:
+    '''
+    The tokens of one input kept in parallel arrays instead of one object per
+    token: a type code (an index into names) and the start and end offsets
+    into text. Values and line numbers are read back from the text when
+    asked for. Indexing returns a Token with the same fields as a sly token.
+    '''
+
+    __slots__ = ("names", "converters", "text", "types", "starts", "ends", "first_line", "_newlines")
+
+    def __init__(self, names, text, lineno=1, converters=None):
+        self.names = names
+        self.converters = converters or (None,) * len(names)
+        self.text = text
+        self.types = array('B')
+        self.starts = array('l')
+        self.ends = array('l')
+        self.first_line = lineno
+        self._newlines = None
+
+    def __len__(self):
+        return len(self.types)
+
+    def __getitem__(self, index):
+        return Token(self.names[self.types[index]], self.value(index), self.line(index), self.starts[index])
+
+    def __iter__(self):
+        for index in range(len(self.types)):
+            yield self[index]
+
+    def type(self, index):
+        return self.names[self.types[index]]
+
+    def type_names(self):
+        names = self.names
+        return [names[code] for code in self.types]
+
+    def value(self, index):
+        value = self.text[self.starts[index]:self.ends[index]]
+        convert = self.converters[self.types[index]]
+        return convert(value) if convert else value
+
+    def values(self):
+        return [self.value(index) for index in range(len(self.types))]
+
+    def terminals(self, terminal_of=None):
+        '''
+        Maps every token to its grammar terminal, TERMINAL_OF_TYPE by default.
+        Types missing from the mapping are kept by name.
+        '''
+        terminal_of = TERMINAL_OF_TYPE if terminal_of is None else terminal_of
+        by_code = [terminal_of.get(name, name) for name in self.names]
+        return [by_code[code] for code in self.types]
+
+    def line_at(self, offset):
+        '''Line number of an offset into text.'''
+        if self._newlines is None:
+            # newline k sits after the first k + 1 lines and k newlines
+            lines = self.text.split("\n")[:-1]
+            self._newlines = array('l', map(add, accumulate(map(len, lines)), count()))
+        return self.first_line + bisect_right(self._newlines, offset)
+
+    def line(self, index):
+        return self.line_at(self.starts[index])
+
+    def splice(self, edit):
+        '''Applies a TokenEdit from Scanner.relex, in place.'''
+        stop = edit.first + edit.removed
+        self.types[edit.first:stop] = edit.types
+        self.starts[edit.first:stop] = edit.starts
+        self.ends[edit.first:stop] = edit.ends
+        if edit.delta:
+            tail = edit.first + len(edit.types)
+            shift(self.starts, tail, edit.delta)
+            shift(self.ends, tail, edit.delta)
+        self.text = edit.text
+        self._newlines = None
+
+
+def shift(offsets, start, delta):
+    '''Adds delta to offsets[start:] of an array('l') in place, through NumPy if installed.'''
+    try:
+        import numpy
+    except ImportError:
+        offsets[start:] = array(offsets.typecode, map(delta.__add__, offsets[start:]))
+        return
+    # array('l') is 4 bytes on Windows and 8 elsewhere, numpy.int_ need not match it
+    numpy.frombuffer(offsets, dtype=f"i{offsets.itemsize}")[start:] += delta
+
+
+class Scanner:
+    '''
+    Tokenizer built from (name, regex) rules compiled into one alternation,
+    so a whole input is tokenized in a single left to right pass. Earlier
+    rules win when two match at the same place. Rules named in ignore are
+    matched but not kept, convert maps rule names to a function applied to
+    their values.
+    '''
+
+    def __init__(self, rules, ignore=(), convert=None):
+        self.names = tuple(name for name, pattern in rules)
+        if len(self.names) > 255:
+            raise ValueError("Scanner supports at most 255 token types")
+        convert = convert or {}
+        self.converters = tuple(convert.get(name) for name in self.names)
+        self.error = len(self.names)
+        # the outermost group of a rule closes last, so match.lastindex is
+        # always the group wrapping the rule that matched
+        self.codes = [None]
+        parts = []
+        for code, (name, pattern) in enumerate(rules + [("error", "(?s:.)")]):
+            self.codes.append(code)
+            self.codes.extend([None] * re.compile(pattern).groups)
+            parts.append(f"({pattern})")
+        self.pattern = re.compile("|".join(parts))
+        self.ignored = frozenset(self.names.index(name) for name in ignore)
+
+    @timed("lex")
+    def scan(self, text, lineno=1):
+        '''Tokenizes text into a TokenArray, raising ValueError on a character no rule matches.'''
+        tokens = TokenArray(self.names, text, lineno, self.converters)
+        add_type = tokens.types.append
+        add_start = tokens.starts.append
+        add_end = tokens.ends.append
+        codes = self.codes
+        ignored = self.ignored
+        error = self.error
+        for match in self.pattern.finditer(text):
+            code = codes[match.lastindex]
+            if code in ignored:
+                continue
+            if code == error:
+                line = lineno + text.count("\n", 0, match.start())
+                raise ValueError('Line %d: Bad character %r' % (line, match.group()))
+            start, end = match.span()
+            add_type(code)
+            add_start(start)
+            add_end(end)
+        PROFILE.count("tokens", len(tokens.types))
+        return tokens
+
+    def stream(self, file, chunk_size=1 << 16, lineno=1):
+        '''
+        Tokenizes a file object or an mmap chunk_size characters (or bytes,
+        decoded as UTF-8) at a time and yields a StreamToken for every token,
+        index being its character offset in the whole input. Only one chunk
+        and the token running over its end are held, so memory does not grow
+        with the input. Raises ValueError on a character no rule matches.
+        '''
+        pattern = self.pattern
+        codes = self.codes
+        names = self.names
+        converters = self.converters
+        ignored = self.ignored
+        error = self.error
+        new = tuple.__new__  # twice as fast as calling StreamToken
+        decoder = None
+        carry = ""
+        offset = 0  # of carry[0] in the input
+        line_start = 0  # offset where line lineno starts
+        while True:
+            # a token longer than a chunk (a long comment) is read on in
+            # growing chunks, so it is not scanned again and again
+            chunk = file.read(max(chunk_size, len(carry)))
+            end = not chunk
+            if not isinstance(chunk, str):
+                decoder = decoder or codecs.getincrementaldecoder("utf-8")()
+                chunk = decoder.decode(chunk, end)
+            text = carry + chunk
+            size = len(text)
+            position = counted = 0
+            for match in pattern.finditer(text):
+                start, stop = match.span()
+                # every character is matched (bad ones by the error rule), so the
+                # last match runs to the end of the chunk; with more input it
+                # might be longer (&&, <=, names, comments), so it waits for it
+                if stop == size and not end:
+                    break
+                position = stop
+                code = codes[match.lastindex]
+                if code in ignored:
+                    continue
+                newlines = text.count("\n", counted, start)
+                if newlines:
+                    lineno += newlines
+                    line_start = offset + text.rindex("\n", counted, start) + 1
+                counted = start
+                if code == error:
+                    raise ValueError('Line %d: Bad character %r' % (lineno, match.group()))
+                value = match.group()
+                convert = converters[code]
+                yield new(StreamToken, (names[code], convert(value) if convert else value, lineno,
+                                        offset + start, offset + start - line_start + 1))
+            newlines = text.count("\n", counted, position)
+            if newlines:
+                lineno += newlines
+                line_start = offset + text.rindex("\n", counted, position) + 1
+            if end:
+                return
+            carry = text[position:]
+            offset += position
+
+    @timed("relex")
+    def relex(self, tokens, text, position, removed, added):
+        '''
+        Works out how tokens, scanned from the text before an edit, change
+        now that it reads text: removed characters at position were replaced
+        by added ones (the arguments of QTextDocument.contentsChange). No rule
+        matches across a newline or looks further than the character after
+        its match, so scanning restarts at the last token ending before the
+        edit, or the start of the edited line if that comes later. It stops
+        at the first token past the edit that starts where an old one did,
+        after which the old tokens only move.
+        Returns a TokenEdit for TokenArray.splice, raises ValueError on a bad
+        character.
+        '''
+        delta = len(text) - len(tokens.text)
+        # QTextDocument counts the paragraph separator after the last line
+        removed = min(removed, len(tokens.text) - position)
+        edit_end = position + removed + delta
+        starts = tokens.starts
+        restart = text.rfind("\n", 0, position) + 1
+        before = bisect_left(tokens.ends, position) - 1
+        if before >= 0 and starts[before] > restart:
+            restart = starts[before]
+        first = bisect_left(starts, restart)
+        old = bisect_left(starts, position + removed)
+        types = array('B')
+        new_starts = array('l')
+        new_ends = array('l')
+        codes = self.codes
+        ignored = self.ignored
+        error = self.error
+        for match in self.pattern.finditer(text, restart):
+            code = codes[match.lastindex]
+            if code in ignored:
+                continue
+            if code == error:
+                line = tokens.first_line + text.count("\n", 0, match.start())
+                raise ValueError('Line %d: Bad character %r' % (line, match.group()))
+            start, end = match.span()
+            if start >= edit_end:
+                while old < len(starts) and starts[old] < start - delta:
+                    old += 1
+                if old < len(starts) and starts[old] == start - delta:
+                    break
+            types.append(code)
+            new_starts.append(start)
+            new_ends.append(end)
+        else:
+            old = len(starts)
+        return TokenEdit(first, old - first, types, new_starts, new_ends, delta, text)
+
+
+# Same rules, in the same order, as the sly lexer in Compiler
+COMPILER_SCANNER = Scanner([
+    ("ignore", "[%s]+" % re.escape(Compiler.ignore)),
+    ("OPEN_BRACKET", Compiler.OPEN_BRACKET),
+    ("CLOSED_BRACKET", Compiler.CLOSED_BRACKET),
+    ("EQ", Compiler.EQ),
+    ("LE", Compiler.LE),
+    ("LT", Compiler.LT),
+    ("GE", Compiler.GE),
+    ("GT", Compiler.GT),
+    ("NE", Compiler.NE),
+    ("ID", Compiler.ID),
+    ("ignore_comment", Compiler.ignore_comment),
+    ("OPERATION_AND", Compiler.OPERATION_AND),
+    ("OPERATION_OR", Compiler.OPERATION_OR),
+    ("OPERATION_NOT", Compiler.OPERATION_NOT),
+    ("NUMBER", Compiler.NUMBER.pattern),
+    ("ignore_newline", Compiler.ignore_newline.pattern),
+], ignore=["ignore", "ignore_comment", "ignore_newline"], convert={"NUMBER": int})
+
+# Grammar terminal each Compiler token stands for in the parser
+TERMINAL_OF_TYPE = {
+    "ID": "identifier",
+    "NUMBER": "identifier",
+    "EQ": "==",
+    "NE": "!=",
+    "LT": "<",
+    "LE": "<=",
+    "GT": ">",
+    "GE": ">=",
+    "OPERATION_AND": "&&",
+    "OPERATION_OR": "||",
+    "OPERATION_NOT": "!",
+    "OPEN_BRACKET": "(",
+    "CLOSED_BRACKET": ")",
+}
+
+
+def lex(text, lineno=1):
+    '''Tokenizes text with the Compiler rules, see Compiler.scan.'''
+    return COMPILER_SCANNER.scan(text, lineno)
+
+
+def stream(file, chunk_size=1 << 16, lineno=1):
+    '''Tokenizes a file object or mmap lazily with the Compiler rules, see Scanner.stream.'''
+    return COMPILER_SCANNER.stream(file, chunk_size, lineno)
+
+
+def relex(tokens, text, position, removed, added):
+    '''Edit to bring tokens from lex up to date with text, see Scanner.relex.'''
+    return COMPILER_SCANNER.relex(tokens, text, position, removed, added)
+
+
+def text_change(old, new):
+    '''
+    The edit that turns old into new, as (position, removed, added) for
+    relex: everything between their common prefix and common suffix.
+    '''
+    # binary searches over slices, so the comparing is done in C
+    size = min(len(old), len(new))
+    low, high = 0, size
+    while low < high:
+        middle = (low + high + 1) // 2
+        if old[:middle] == new[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    prefix = low
+    low, high = 0, size - prefix
+    while low < high:
+        middle = (low + high + 1) // 2
+        if old[len(old) - middle:] == new[len(new) - middle:]:
+            low = middle
+        else:
+            high = middle - 1
+    return prefix, len(old) - prefix - low, len(new) - prefix - low
+
+
+def get_input(input, flag=False):
+    '''
+    Tokenizes an expression for the parser and returns the list of grammar
+    terminals, or None if it does not pass the lexer. input may also be a
+    TokenArray that was already scanned. With flag set, identifiers and
+    numbers are returned by their text instead of as "identifier".
+    '''
+    if isinstance(input, TokenArray):
+        tokens = input
+    else:
+        try:
+            tokens = lex(input)
+        except ValueError:
+            return None
+    if not flag:
+        return tokens.terminals()
+    text = tokens.text
+    operands = {"ID", "NUMBER"}
+    return [text[tokens.starts[index]:tokens.ends[index]] if tokens.type(index) in operands else terminal
+            for index, terminal in enumerate(tokens.terminals())]
@@ -0,0 +1,692 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Sequence
+from itertools import accumulate
+from .grammar import Grammar, LL1Table
+from .lexer import TERMINAL_OF_TYPE, TokenArray, get_input, shift
+from .profiling import PROFILE, timed
+
+
+class ParseTrace:
+    '''
+    Step by step record of a parse, used for the table on the parse page and
+    for drawing the parse tree.
+
+    Only what changes is kept per step: the move taken, the cursor into the
+    input and a pointer to the stack. The stack is stored as linked
+    (symbol, below) cells shared between steps, so the trace grows linearly
+    with the number of steps instead of steps * stack depth. Snapshots are
+    rebuilt on demand with stack(step) and input(step).
+
+    For the older [["Stack"], ["Input"], ["Move"]] layout, trace[0], trace[1]
+    and trace[2] return lazy columns that start with the header, the same way
+    the lists did.
+
+    The parser also emits the parse tree as it expands. Nodes are numbered
+    in the order they are created, node 0 being the start symbol, and every
+    production applied adds its body (or one EPSILON leaf) as the next ids
+    below the node it expanded. Since the production is already the move,
+    only that parent node is stored per expansion.
+    '''
+
+    headers = ("Stack", "Input", "Move")
+
+    POP = -1
+    # symbol of the leaf drawn under a variable expanded with an empty production
+    EPSILON = -1
+
+    def __init__(self):
+        self.tokens = []
+        self.table = None
+        self.result = None
+        self._stacks = []
+        self._cursors = array('l')
+        self._moves = []
+        self._move_count = 0
+        self._parents = array('l')
+
+    def __len__(self):
+        return len(self._cursors)
+
+    def __getitem__(self, column):
+        return _TraceColumn(self, range(3)[column])
+
+    def record(self, stack, cursor):
+        '''Starts a step with the given stack cell and input cursor.'''
+        self._stacks.append(stack)
+        self._cursors.append(cursor)
+        self._moves.append(None)
+
+    def set_move(self, move):
+        '''Sets the move taken at the last recorded step: a production index, or POP for a match.'''
+        self._moves[-1] = move
+        self._move_count += 1
+
+    def tree(self):
+        '''
+        The parse tree as ({node: [children in order]}, {node: label}), rooted
+        at node 0. Built in one pass over the expansions; after a failed parse
+        it is the tree as far as the parser got.
+        '''
+        if self.table is None:
+            return {}, {}
+        names = self.table.symbols
+        productions = self.table.productions
+        children = {}
+        labels = {0: names[self.table.start]}
+        expansions = (move for move in self._moves if move is not None and move != self.POP)
+        for parent, move in zip(self._parents, expansions):
+            body = productions[move][1] or (self.EPSILON,)
+            first = len(labels)
+            children[parent] = list(range(first, first + len(body)))
+            for node, symbol in enumerate(body, first):
+                labels[node] = names[symbol] if symbol != self.EPSILON else "ε"
+        return children, labels
+
+    def stack(self, step):
+        '''Stack at the start of step, bottom first.'''
+        names = self.table.symbols
+        symbols = []
+        cell = self._stacks[step]
+        while cell:
+            symbols.append(names[cell[0]])
+            cell = cell[1]
+        symbols.reverse()
+        return symbols
+
+    def input(self, step):
+        '''Remaining input at the start of step, ending with "$".'''
+        return self.tokens[self._cursors[step]:] + ['$']
+
+    def cursor(self, step):
+        return self._cursors[step]
+
+    def move(self, step):
+        '''Move taken at step as shown in the table, None for the last step.'''
+        move = self._moves[step]
+        if move is None:
+            return None
+        if move == self.POP:
+            return f"pop -> {self.tokens[self._cursors[step]]}"
+        return self.table.moves[move]
+
+    def moves(self):
+        return [self.move(step) for step in range(len(self)) if self._moves[step] is not None]
+
+
+class _TraceColumn(Sequence):
+    '''A column of a ParseTrace in the old list layout: header first, then one entry per step.'''
+
+    def __init__(self, trace, column):
+        self.trace = trace
+        self.column = column
+
+    def __len__(self):
+        if self.column == 2:
+            return 1 + self.trace._move_count
+        return 1 + len(self.trace)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("trace column index out of range")
+        if index == 0:
+            return ParseTrace.headers[self.column]
+        if self.column == 0:
+            return self.trace.stack(index - 1)
+        if self.column == 1:
+            return self.trace.input(index - 1)
+        return self.trace.move(index - 1)
+
+
+class ParseNode:
+    '''
+    A node of a parse tree: a symbol code of an LL1Table, the production it
+    was expanded with (-1 for terminals) and its children in order. width
+    is the number of tokens it covers. Positions are not stored, so a
+    subtree stays valid wherever an edit moves it.
+
+    A tail variable (exp', term', factor') is one node for its whole chain:
+    children are the bodies of all its expansions but the recursive symbol,
+    and steps[j] is the production expanded at child j, or -1 where no
+    expansion starts. steps has len(children) + 1 entries, the last for the
+    empty production that ends the chain. ends holds the running total of
+    the children's widths, so a child is found by bisection, and production
+    is the first expansion. Chains of thousands of operands so stay one
+    level deep.
+    '''
+
+    __slots__ = ("symbol", "production", "children", "width", "steps", "ends")
+
+    def __init__(self, symbol, production=-1, children=(), width=0):
+        self.symbol = symbol
+        self.production = production
+        self.children = children
+        self.width = width
+        self.steps = None
+        self.ends = None
+
+    def __repr__(self):
+        return f"ParseNode({self.symbol}, {self.production}, width={self.width})"
+
+    def __iter__(self):
+        '''Walks the subtree in preorder without recursion.'''
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.children))
+
+    def decisions(self):
+        '''Yields (variable, production) of every expansion in the subtree.'''
+        for node in self:
+            if node.steps is not None:
+                for production in node.steps:
+                    if production >= 0:
+                        yield node.symbol, production
+            elif node.production >= 0:
+                yield node.symbol, node.production
+
+    def offset(self, index):
+        '''Tokens before child index of a chain node.'''
+        return self.ends[index - 1] if index else 0
+
+
+def chain_variables(table):
+    '''
+    Codes of the tail variables, the ones with an empty production and one
+    ending in themselves (exp', term' and factor').
+    '''
+    empty = {lhs for lhs, rhs in table.productions if not rhs}
+    return frozenset(lhs for lhs, rhs in table.productions if rhs and rhs[-1] == lhs and lhs in empty)
+
+
+def derive(table, codes, cursor, symbol, resync=None):
+    '''
+    Runs the LL(1) driver for a single symbol over encoded tokens, starting
+    at cursor, and builds its parse tree. Returns the ParseNode and the
+    cursor after it, or None and the cursor where the input went wrong.
+    If symbol is right recursive and resync(cursor) is true where its chain
+    is about to expand again, the driver stops there and the node is left
+    without the rest of its chain (and its steps without the last entry).
+    '''
+    rows = table.rows
+    pushes = table.pushes
+    variable_count = table.variable_count
+    chains = chain_variables(table)
+    # per production of a chain variable: the body without the symbol
+    # that continues the chain, and whether there is one
+    tails = [(body[1:], True) if body and body[0] == lhs else (body, False)
+             for (lhs, rhs), body in zip(table.productions, pushes)]
+    root = ParseNode(symbol)
+    order = []
+    stack = [root]
+    stopped = False
+    while stack:
+        node = stack.pop()
+        symbol = node.symbol
+        if symbol < variable_count:
+            if node is root and resync is not None and node.steps is not None and resync(cursor):
+                stopped = True
+                break
+            p = rows[symbol][codes[cursor]]
+            if p < 0:
+                return None, cursor
+            if symbol not in chains:
+                node.production = p
+                children = [ParseNode(code) for code in pushes[p]]
+                stack.extend(children)
+                children.reverse()
+                node.children = children
+                order.append(node)
+                continue
+            steps = node.steps
+            if steps is None:
+                node.production = p
+                node.children = []
+                node.steps = steps = array('l')
+                order.append(node)
+            body, goes_on = tails[p]
+            if goes_on:
+                # the chain goes on after this body, in the same node
+                stack.append(node)
+            steps.append(p)
+            if body:
+                children = [ParseNode(code) for code in body]
+                stack.extend(children)
+                children.reverse()
+                node.children.extend(children)
+                for _ in range(len(body) - 1):
+                    steps.append(-1)
+        elif codes[cursor] == symbol:
+            node.width = 1
+            cursor += 1
+        else:
+            return None, cursor
+    # children come after their parent in preorder, so widths add up backwards
+    for node in reversed(order):
+        if node.steps is None:
+            node.width = sum(child.width for child in node.children)
+            continue
+        node.ends = array('l', accumulate(child.width for child in node.children))
+        node.width = node.ends[-1] if node.ends else 0
+        if len(node.steps) == len(node.children) and not (node is root and stopped):
+            node.steps.append(-1)
+    return root, cursor
+
+
+class Parser:
+
+    def __init__(self, grammar=None, table=None):
+        if table:
+            self.table = table
+        else:
+            self.table = {}
+
+        self.grammar = grammar
+        self.stack = []
+        self._compiled = None
+
+    def set_table(self, table):
+        self.table = table
+        self._compiled = None
+
+    def set_grammar(self, grammar):
+        self.grammar = grammar
+        self._compiled = None
+
+    @property
+    def compiled(self):
+        '''The grammar and table as an LL1Table, compiled on first use.'''
+        if self._compiled is None:
+            self._compiled = LL1Table.compile(self.grammar, self.table)
+        return self._compiled
+
+    @timed("parse")
+    def parse(self, process, input, verbose=False):
+        '''
+        Runs the LL(1) driver over a list of terminals, or over the TokenArray
+        from Compiler.scan, and returns True if it belongs to the grammar.
+        The list is not modified, a cursor walks over it so a parse is
+        linear in the number of tokens.
+
+        process is an optional ParseTrace that gets every step recorded into it.
+        The older [["Stack"], ["Input"], ["Move"]] lists are still accepted and
+        get filled with full snapshots; pass None to skip tracing.
+        '''
+        if isinstance(input, TokenArray):
+            input = input.terminals()
+        if not input: return "err"
+        if process is None or isinstance(process, ParseTrace):
+            trace = process
+        else:
+            trace = ParseTrace()
+        table = self.compiled
+        rows = table.rows
+        pushes = table.pushes
+        variable_count = table.variable_count
+        names = table.symbols
+        tokens = table.encode(input)
+        end = len(tokens)
+        tokens.append(table.codes['$'])
+        self.stack = stack = [table.codes['$'], table.start]
+        cell = (table.start, (table.codes['$'], None))
+        if trace is not None:
+            trace.tokens = input
+            trace.table = table
+            # parse tree node of every symbol on the stack, "$" has none
+            nodes = [-1, 0]
+            parents = trace._parents
+            sizes = [len(body) or 1 for head, body in table.productions]
+            count = 1
+        cursor = 0
+        next = tokens[0]
+        result = True
+
+        while stack:
+            if trace is not None:
+                trace.record(cell, cursor)
+            if verbose: print(input[cursor + 1:], 'next :', input[cursor] if cursor < end else '$')
+            tos = stack.pop()
+            if verbose: print([names[symbol] for symbol in stack], 'tos : ', names[tos])
+
+            if tos < variable_count:
+                p = rows[tos][next]
+                if p < 0:
+                    result = False
+                    break
+                if trace is None:
+                    stack.extend(pushes[p])
+                    continue
+                trace.set_move(p)
+                # the children of the expanded node are the next ids, pushed last first
+                parents.append(nodes.pop())
+                nodes.extend(range(count + len(pushes[p]) - 1, count - 1, -1))
+                count += sizes[p]
+                cell = cell[1]
+                for symbol in pushes[p]:
+                    stack.append(symbol)
+                    cell = (symbol, cell)
+            elif next == tos:
+                if trace is not None:
+                    cell = cell[1]
+                    nodes.pop()
+                if cursor < end:
+                    if trace is not None:
+                        trace.set_move(ParseTrace.POP)
+                    cursor += 1
+                    next = tokens[cursor]
+            else:
+                if verbose: print("String does not belong to the Grammar")
+                result = False
+                break
+
+        if trace is not None:
+            trace.result = result
+            PROFILE.count("parse steps", len(trace))
+            if trace is not process:
+                with PROFILE.stage("trace copy"):
+                    for column in range(3):
+                        process[column].extend(trace[column][1:])
+        return result
+
+
+RULES = "exp : term exp'\n" \
+        "exp' : || term exp' |\n" \
+        "term : factor term'\n" \
+        "term' : && factor term' |\n" \
+        "factor : operand factor'\n" \
+        "factor' : comop operand factor' |\n" \
+        "comop : > | >= | < | <= | == | !=\n" \
+        "operand : ! operand | ( exp ) | identifier"
+GRAMMAR = Grammar.from_rules(RULES)
+VARIABLES = GRAMMAR.variables
+TERMINALS = GRAMMAR.terminals
+PRODUCTIONS = GRAMMAR.productions
+START_VARIABLE = GRAMMAR.start
+FIRST = GRAMMAR.first_sets()
+FOLLOW = GRAMMAR.follow_sets(FIRST)
+PARSING_TABLE = GRAMMAR.parsing_table()
+
+# Shared by every call to parse(); its table is compiled once on first use.
+PARSER = Parser(GRAMMAR, PARSING_TABLE)
+
+
+def parse(process, input):
+    '''
+    Parses an expression with PARSER. input is either the text, which goes
+    through the Compiler lexer first, or its TokenArray if that was already
+    done. Returns True or False, or "err" when the input is empty or could
+    not be tokenized. process may be a ParseTrace, or None to skip the trace.
+    '''
+    if not isinstance(input, TokenArray):
+        input = get_input(input)
+    return PARSER.parse(process, input, verbose=False)
+
+
+class IncrementalParser:
+    '''
+    Parses the same input over and over while it is edited, keeping the
+    parse tree of the last successful parse. Edits that leave the input
+    invalid are merged into one pending change against that tree, so
+    typing through an invalid state doesn't throw the tree away.
+
+    edit() walks down to the smallest exp, term or factor (regions) that
+    covers the changed tokens and runs the driver for that symbol alone.
+    When the new subtree ends right before the same token the old one did,
+    and the decisions taken outside it on its first token still hold, the
+    rest of the tree is kept as it is. Otherwise the next enclosing region is
+    tried, and at worst the whole input. Inside a chain of operators (see
+    ParseNode) only its expansions from the edited one on are reparsed, up
+    to the first one that starts where an old one after the edit did. A
+    chain's children are found by bisection, and the tokens after the edit
+    are moved with one vectorised shift of its ends. An edit so costs the
+    depth of the tree plus the size of the part reparsed, not the length of
+    the input.
+    '''
+
+    def __init__(self, parser=None, regions=("exp", "term", "factor")):
+        self.parser = parser or PARSER
+        self.regions = regions
+        self.codes = []
+        self.root = None
+        self.pending = None
+        self.result = None
+        self._type_codes = {}
+
+    @timed("reparse")
+    def parse(self, tokens):
+        '''Parses a TokenArray or a list of terminals from scratch, returns the same as Parser.parse.'''
+        self.codes = self._encode(tokens, 0, len(tokens))
+        self.codes.append(self.parser.compiled.codes['$'])
+        self.root = None
+        self.pending = None
+        return self._parse_all()
+
+    @timed("reparse")
+    def edit(self, tokens, first, removed, added):
+        '''
+        Reparses after an edit. tokens is the whole new input, in which the
+        old tokens[first:first + removed] were replaced by added new ones
+        (a TokenEdit from relex gives first, removed and len(types)).
+        '''
+        table = self.parser.compiled
+        codes = self.codes
+        changed = self._encode(tokens, first, first + added)
+        if codes[first:first + removed] == changed:
+            # same terminals, e.g. a renamed identifier: nothing to reparse
+            return self.result
+        codes[first:first + removed] = changed
+        if self.pending is not None:
+            # one change from the tokens of the tree to the current ones
+            pending_first, pending_removed, pending_added = self.pending
+            end = max(pending_first + pending_added, first + removed)
+            first, removed, added = (min(pending_first, first), end + pending_removed - pending_added,
+                                     end + added - removed)
+            removed -= first
+            added -= first
+        self.pending = (first, removed, added)
+        if self.root is None or len(codes) == 1:
+            return self._parse_all()
+        delta = added - removed
+        stop = first + removed
+        # (node, start, index in its parent) from the root down to the
+        # deepest node covering the old tokens[first:stop]
+        path = [(self.root, 0, -1)]
+        while True:
+            node, start, _ = path[-1]
+            inside = self._covering(node, start, first, stop)
+            if inside is None:
+                break
+            path.append(inside)
+        regions = {table.codes[name] for name in self.regions if name in table.codes}
+        for depth in range(len(path) - 1, -1, -1):
+            node, start, index = path[depth]
+            if node.steps is not None and depth + 1 < len(path):
+                result = self._reparse_chain(path, depth, first, stop, delta)
+                if result is not None:
+                    return result
+            if node.symbol not in regions:
+                continue
+            if first == start and depth and not self._context_holds(path, depth - 1, index, start):
+                continue
+            new, cursor = derive(table, codes, start, node.symbol)
+            if new is None:
+                # the full parse gets here in the same state, and fails the same way
+                self.result = False
+                return False
+            if cursor != start + node.width + delta:
+                continue
+            if depth:
+                path[depth - 1][0].children[index] = new
+            else:
+                self.root = new
+            return self._done(path, depth, delta)
+        return self._parse_all()
+
+    @staticmethod
+    def _covering(node, start, first, stop):
+        '''
+        (child, start, index) of the child of node covering the old
+        tokens[first:stop], or None. An insertion between two children goes
+        to the one after it, if there is one.
+        '''
+        ends = node.ends
+        if ends is None:
+            inside = None
+            for index, child in enumerate(node.children):
+                end = start + child.width
+                if start <= first and stop <= end and child.width:
+                    inside = (child, start, index)
+                    if first < end:
+                        break
+                start = end
+            return inside
+        offset = first - start
+        index = bisect_right(ends, offset)
+        if index == len(ends):
+            if not ends or offset != ends[-1] or stop != first:
+                return None
+            index = bisect_left(ends, offset)
+        if stop > start + ends[index]:
+            return None
+        return node.children[index], start + node.offset(index), index
+
+    def _reparse_chain(self, path, depth, first, stop, delta):
+        '''
+        Reparses the chain node path[depth] from the expansion holding the
+        edit on, until it expands again where an old expansion after the
+        edit started, and splices the new expansions in. Returns None if
+        that doesn't work out.
+        '''
+        table = self.parser.compiled
+        node, start, _ = path[depth]
+        steps, ends = node.steps, node.ends
+        index = path[depth + 1][2]
+        while steps[index] < 0:
+            index -= 1
+        begin = start + node.offset(index)
+        if first == begin and not self._context_holds(path, depth, index, begin):
+            return None
+        found = []
+
+        def resync(cursor):
+            # offset of the cursor in the old chain, past the edit
+            offset = cursor - delta - start
+            if offset < stop - start:
+                return False
+            j = bisect_left(ends, offset) + 1 if offset else 0
+            while j <= len(ends) and node.offset(j) == offset:
+                if steps[j] >= 0 and j >= index:
+                    found.append(j)
+                    return True
+                j += 1
+            return False
+
+        new, cursor = derive(table, self.codes, begin, node.symbol, resync)
+        if new is None:
+            self.result = False
+            return False
+        if found:
+            j = found[0]
+        elif cursor == start + node.width + delta:
+            j = len(node.children)
+        else:
+            return None
+        offset = node.offset(index)
+        node.children[index:j] = new.children
+        if found:
+            steps[index:j] = new.steps
+            ends[index:j] = array('l', [offset + end for end in new.ends])
+            shift(ends, index + len(new.children), delta)
+        else:
+            del steps[index:]
+            steps.extend(new.steps)
+            del ends[index:]
+            ends.extend(offset + end for end in new.ends)
+        node.production = steps[0]
+        node.width += delta
+        return self._done(path, depth, delta)
+
+    def _done(self, path, depth, delta):
+        '''Moves what follows path[depth] by delta in the nodes above it.'''
+        for level in range(depth):
+            above = path[level][0]
+            above.width += delta
+            if above.ends is not None:
+                shift(above.ends, path[level + 1][2], delta)
+        self.pending = None
+        self.result = True
+        return True
+
+    def _context_holds(self, path, level, index, start):
+        '''
+        Whether the expansions taken at token start before child index of
+        path[level] (in its chain up to that child, in its ancestors starting
+        there and in empty nodes right before it) still pick the same
+        productions now that this token changed.
+        '''
+        rows = self.parser.compiled.rows
+        next = self.codes[start]
+        checked = []
+        while level >= 0:
+            parent, parent_start, _ = path[level]
+            if parent.steps is not None:
+                j = index
+                while j >= 0 and parent_start + parent.offset(j) == start:
+                    if parent.steps[j] >= 0:
+                        checked.append((parent.symbol, parent.steps[j]))
+                    j -= 1
+            children = parent.children
+            while index and not children[index - 1].width:
+                index -= 1
+                checked.extend(children[index].decisions())
+            if index:
+                node = children[index - 1]
+                while node.children:
+                    below = len(node.children)
+                    if node.steps is not None:
+                        j = below
+                        while j >= 0 and node.offset(j) == node.width:
+                            if node.steps[j] >= 0:
+                                checked.append((node.symbol, node.steps[j]))
+                            j -= 1
+                    while below and not node.children[below - 1].width:
+                        below -= 1
+                        checked.extend(node.children[below].decisions())
+                    if not below:
+                        break
+                    node = node.children[below - 1]
+            if parent_start != start:
+                break
+            if parent.steps is None:
+                checked.append((parent.symbol, parent.production))
+            index = path[level][2]
+            level -= 1
+        return all(rows[symbol][next] == production for symbol, production in checked)
+
+    def _parse_all(self):
+        table = self.parser.compiled
+        codes = self.codes
+        if len(codes) == 1:
+            self.result = "err"
+            return "err"
+        root, cursor = derive(table, codes, 0, table.start)
+        self.result = root is not None and codes[cursor] == table.codes['$']
+        if self.result:
+            self.root = root
+            self.pending = None
+        return self.result
+
+    def _encode(self, tokens, start, stop):
+        table = self.parser.compiled
+        if not isinstance(tokens, TokenArray):
+            return table.encode(tokens[start:stop])
+        by_type = self._type_codes.get(tokens.names)
+        if by_type is None:
+            by_type = table.encode(TERMINAL_OF_TYPE.get(name, name) for name in tokens.names)
+            self._type_codes[tokens.names] = by_type
+        return [by_type[code] for code in tokens.types[start:stop]]
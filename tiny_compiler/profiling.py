@@ -0,0 +1,138 @@
+"""
+Per-stage timing of the pipeline. The lexer, parser, DFA, AST builder,
+tree construction, layout, drawing and rendering each run under a named
+stage of PROFILE, and count what they produce (tokens, parse steps, tree
+nodes). Nothing is recorded until PROFILE.enable() is called, so while it
+is off every stage costs one attribute check. With cprofile=True a cProfile
+capture runs alongside, for the thread that enabled it.
+
+    python -m tiny_compiler parse --profile inputs.txt
+    python -m tiny_compiler parse --cprofile parse.pstats inputs.txt
+"""
+import functools
+import threading
+import time
+
+
+class _Stage:
+
+    __slots__ = ("profile", "name", "start")
+
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profile.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _Off:
+    '''What stage() hands out while the profile is disabled.'''
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_OFF = _Off()
+
+
+class Profile:
+    '''
+    Timings and counters of one profiling session. timings maps a stage to
+    [calls, seconds], counters a name to a number. Stages nest, and the
+    time of a stage includes the stages it calls.
+    '''
+
+    def __init__(self):
+        self.enabled = False
+        self.timings = {}
+        self.counters = {}
+        self.profiler = None
+        self._lock = threading.Lock()
+
+    def enable(self, cprofile=False):
+        self.enabled = True
+        if cprofile and self.profiler is None:
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def disable(self):
+        self.enabled = False
+        if self.profiler is not None:
+            self.profiler.disable()
+
+    def reset(self):
+        '''Forgets the timings and counters, the cProfile capture goes on.'''
+        with self._lock:
+            self.timings = {}
+            self.counters = {}
+
+    def stage(self, name):
+        '''Context manager timing a stage, a shared no-op while disabled.'''
+        if not self.enabled:
+            return _OFF
+        return _Stage(self, name)
+
+    def add(self, name, seconds):
+        with self._lock:
+            entry = self.timings.setdefault(name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    def count(self, name, number=1):
+        if self.enabled:
+            with self._lock:
+                self.counters[name] = self.counters.get(name, 0) + number
+
+    def report(self):
+        '''The timings and counters as plain dicts, for JSON.'''
+        return {"stages": {name: {"calls": calls, "seconds": seconds} for name, (calls, seconds) in self.timings.items()},
+                "counters": dict(self.counters)}
+
+    def summary(self):
+        '''One line for the status bar: the time of every stage, then the counters.'''
+        stages = ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, (calls, seconds) in self.timings.items())
+        counters = ", ".join(f"{number} {name}" for name, number in self.counters.items())
+        return " | ".join(part for part in (stages, counters) if part)
+
+    def format(self):
+        '''A table of the stages, slowest first, and the counters.'''
+        lines = [f"{'stage':<16}{'calls':>8}{'total ms':>12}{'mean ms':>12}"]
+        for name, (calls, seconds) in sorted(self.timings.items(), key=lambda item: -item[1][1]):
+            lines.append(f"{name:<16}{calls:>8}{seconds * 1000:>12.2f}{seconds * 1000 / calls:>12.3f}")
+        if self.counters:
+            lines.append(f"{'counter':<16}{'count':>8}")
+        for name, number in self.counters.items():
+            lines.append(f"{name:<16}{number:>8}")
+        return "\n".join(lines)
+
+    def dump_stats(self, path):
+        '''Writes the cProfile capture to path, for pstats or snakeviz.'''
+        self.profiler.dump_stats(path)
+
+
+PROFILE = Profile()
+
+
+def timed(stage):
+    '''Decorator running every call of a function as a stage of PROFILE.'''
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not PROFILE.enabled:
+                return function(*args, **kwargs)
+            with _Stage(PROFILE, stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
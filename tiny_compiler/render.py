@@ -0,0 +1,180 @@
+"""
+Rendering of trees to files, without a window: SVG and DOT are written
+directly a line at a time, so trees of any size go out without being built
+up in memory, and PNG and PDF go through a matplotlib Figure on the Agg
+backend (pyplot is never imported). Nodes are placed by
+tiny_compiler.layout.
+
+A tree is given as a mapping of every node to its children, a mapping of
+every node to its label and the root node; render_ast and
+render_parse_tree build those from an expression or a parse trace.
+"""
+import io
+import os
+
+from .layout import tidy_layout
+from .profiling import PROFILE, timed
+from .syntax_tree import Node, build_ast
+
+FORMATS = ("svg", "dot", "png", "pdf")
+
+# sizes in SVG user units (pixels), which are also points in PNG/PDF output
+FONT_SIZE = 12
+CHAR_WIDTH = 7.2
+NODE_HEIGHT = 22
+PADDING = 8
+LEVEL_GAP = 56
+MARGIN = 12
+# PNGs of larger trees are scaled down to this many pixels, encoding a bigger
+# image takes minutes (SVG has no such limit)
+MAX_PIXELS = 16_000_000
+
+
+def escape(text):
+    '''Escapes text for SVG (xml.sax.saxutils would add 30 ms of imports).'''
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def walk(children, root):
+    '''Yields (node, parent) in preorder, parent being None for the root.'''
+    stack = [(root, None)]
+    while stack:
+        node, parent = stack.pop()
+        yield node, parent
+        below = children.get(node, ())
+        for index in range(len(below) - 1, -1, -1):
+            stack.append((below[index], node))
+
+
+def place(children, labels, root):
+    '''
+    Pixel geometry of a tree: returns (width, height, boxes) where boxes maps
+    every node to the (center x, center y, box width) of its label.
+    '''
+    widest = max(len(str(label)) for label in labels.values())
+    step = widest * CHAR_WIDTH + 2 * PADDING + MARGIN
+    pos = tidy_layout(children, root, distance=step, level_gap=LEVEL_GAP)
+    left = min(x for x, y in pos.values())
+    boxes = {}
+    width = height = 0
+    for node, (x, y) in pos.items():
+        box = len(str(labels[node])) * CHAR_WIDTH + 2 * PADDING
+        x = x - left + step / 2
+        y = NODE_HEIGHT / 2 + MARGIN - y
+        boxes[node] = (x, y, box)
+        width = max(width, x)
+        height = max(height, y)
+    return width + step / 2, height + NODE_HEIGHT / 2 + MARGIN, boxes
+
+
+def iter_svg(children, labels, root):
+    '''The lines of an SVG drawing of a tree, edges first so nodes cover them.'''
+    width, height, boxes = place(children, labels, root)
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.0f}" height="{height:.0f}" '
+           f'viewBox="0 0 {width:.1f} {height:.1f}" font-family="sans-serif" font-size="{FONT_SIZE}">\n')
+    yield '<g stroke="#555" stroke-width="1">\n'
+    for node, parent in walk(children, root):
+        if parent is not None:
+            x1, y1, _ = boxes[parent]
+            x2, y2, _ = boxes[node]
+            yield f'<line x1="{x1:.1f}" y1="{y1:.1f}" x2="{x2:.1f}" y2="{y2:.1f}"/>\n'
+    yield '</g>\n<g text-anchor="middle" dominant-baseline="central">\n'
+    for node, parent in walk(children, root):
+        x, y, box = boxes[node]
+        yield (f'<rect x="{x - box / 2:.1f}" y="{y - NODE_HEIGHT / 2:.1f}" width="{box:.1f}" '
+               f'height="{NODE_HEIGHT}" rx="8" fill="#b0c4de" stroke="#555"/>'
+               f'<text x="{x:.1f}" y="{y:.1f}">{escape(str(labels[node]))}</text>\n')
+    yield '</g>\n</svg>\n'
+
+
+def iter_dot(children, labels, root):
+    '''The lines of a Graphviz DOT description of a tree; needs no layout.'''
+    ids = {}
+    yield "digraph tree {\n"
+    yield '  node [shape=box, style="rounded,filled", fillcolor="#b0c4de", fontname="sans-serif"];\n'
+    for node, parent in walk(children, root):
+        ids[node] = len(ids)
+        label = str(labels[node]).replace("\\", "\\\\").replace('"', '\\"')
+        yield f'  n{ids[node]} [label="{label}"];\n'
+        if parent is not None:
+            yield f"  n{ids[parent]} -> n{ids[node]};\n"
+    yield "}\n"
+
+
+def write_figure(children, labels, root, file, format):
+    '''Draws a tree on an Agg Figure and saves it to file as PNG or PDF.'''
+    from matplotlib.collections import LineCollection
+    from matplotlib.figure import Figure
+    width, height, boxes = place(children, labels, root)
+    dpi = 72
+    if format == "png" and width * height > MAX_PIXELS:
+        dpi = 72 * (MAX_PIXELS / (width * height)) ** 0.5
+    figure = Figure(figsize=(width / 72, height / 72), dpi=72)
+    axes = figure.add_axes([0, 0, 1, 1])
+    axes.set_xlim(0, width)
+    axes.set_ylim(height, 0)
+    axes.axis("off")
+    edges = [(boxes[parent][:2], boxes[node][:2]) for node, parent in walk(children, root) if parent is not None]
+    axes.add_collection(LineCollection(edges, colors="#555", linewidths=1, zorder=1))
+    for node, (x, y, box) in boxes.items():
+        axes.text(x, y, str(labels[node]), ha="center", va="center", fontsize=FONT_SIZE, zorder=2,
+                  bbox=dict(boxstyle="round,pad=0.4", facecolor="#b0c4de", edgecolor="#555"))
+    figure.savefig(file, format=format, dpi=dpi)
+
+
+def render(children, labels, root, out, format=None):
+    '''
+    Writes a tree to out, a path or a file object, as svg, dot, png or pdf.
+    format defaults to the extension of the path, or svg for a file object.
+    SVG and DOT may go to a text or a binary stream, PNG and PDF need a
+    binary one.
+    '''
+    if format is None:
+        format = os.path.splitext(out)[1][1:].lower() if isinstance(out, str) else "svg"
+    if format not in FORMATS:
+        raise ValueError(f"Unknown format {format!r}, expected one of {', '.join(FORMATS)}")
+    if not isinstance(out, str):
+        write(children, labels, root, out, format)
+    elif format in ("svg", "dot"):
+        with open(out, "w", encoding="utf-8") as file:
+            write(children, labels, root, file, format)
+    else:
+        with open(out, "wb") as file:
+            write(children, labels, root, file, format)
+
+
+@timed("render")
+def write(children, labels, root, out, format):
+    PROFILE.count("rendered nodes", len(labels))
+    if format in ("png", "pdf"):
+        write_figure(children, labels, root, out, format)
+        return
+    lines = iter_svg(children, labels, root) if format == "svg" else iter_dot(children, labels, root)
+    if isinstance(out, io.TextIOBase):
+        out.writelines(lines)
+    else:
+        out.writelines(line.encode("utf-8") for line in lines)
+
+
+def ast_tree(root):
+    '''(children, labels, root) of an AST, with its Node objects as the nodes.'''
+    children = {node: node.children for node in root if node.children}
+    labels = {node: node.label for node in root}
+    return children, labels, root
+
+
+def render_ast(input, out, format=None):
+    '''Renders the AST of an expression, given as text, a TokenArray or a Node.'''
+    root = input if input is None or isinstance(input, Node) else build_ast(input)
+    if root is None:
+        raise ValueError("Nothing to render, the expression is empty")
+    render(*ast_tree(root), out, format)
+
+
+def render_parse_tree(trace, out, format=None):
+    '''Renders the parse tree the parser emitted into a ParseTrace.'''
+    children, labels = trace.tree()
+    if not labels:
+        raise ValueError("Nothing to render, the trace has no parse tree")
+    render(children, labels, 0, out, format)
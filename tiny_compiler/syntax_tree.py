@@ -0,0 +1,129 @@
+from .lexer import TokenArray, lex
+from .profiling import PROFILE, timed
+
+
+# Binding strength of the binary operators, "!" binds tighter than all of them
+PRECEDENCE = {
+    "OPERATION_OR": 1,
+    "OPERATION_AND": 2,
+    "EQ": 3, "NE": 3, "LT": 3, "LE": 3, "GT": 3, "GE": 3,
+}
+OPERANDS = ("ID", "NUMBER")
+
+
+class Node:
+    '''
+    One node of the abstract syntax tree: an operator with its operands as
+    children, or an operand with no children. label is the operator or the
+    operand as written, token its index in the TokenArray it came from.
+    '''
+
+    __slots__ = ("label", "children", "token")
+
+    def __init__(self, label, children=(), token=-1):
+        self.label = label
+        self.children = children
+        self.token = token
+
+    def __repr__(self):
+        if not self.children:
+            return f"Node({self.label!r})"
+        return f"Node({self.label!r}, {list(self.children)!r})"
+
+    def __iter__(self):
+        '''Walks the subtree in preorder without recursion.'''
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.children))
+
+
+@timed("ast")
+def build_ast(tokens):
+    '''
+    Builds the AST of an expression, given as text or as the TokenArray from
+    Compiler.scan, in one pass over the tokens (operator precedence with
+    explicit stacks, so nesting depth is not limited by recursion). Returns
+    the root Node, or None for an empty input. Raises ValueError if the
+    tokens do not form an expression.
+    '''
+    if not isinstance(tokens, TokenArray):
+        tokens = lex(tokens)
+    names = tokens.names
+    operands = []
+    operators = []  # (type name, token index), "(" and "!" included
+    expect_operand = True
+
+    def reduce():
+        name, index = operators.pop()
+        right = operands.pop()
+        left = operands.pop()
+        operands.append(Node(tokens.value(index), (left, right), index))
+
+    def close_operand():
+        while operators and operators[-1][0] == "OPERATION_NOT":
+            index = operators.pop()[1]
+            operands.append(Node("!", (operands.pop(),), index))
+
+    for index, code in enumerate(tokens.types):
+        name = names[code]
+        if expect_operand:
+            if name in OPERANDS:
+                operands.append(Node(str(tokens.value(index)), (), index))
+                close_operand()
+                expect_operand = False
+            elif name == "OPERATION_NOT" or name == "OPEN_BRACKET":
+                operators.append((name, index))
+            else:
+                raise ValueError(f"Expected an operand at token {index + 1}, got {tokens.value(index)!r}")
+        elif name in PRECEDENCE:
+            precedence = PRECEDENCE[name]
+            while operators and PRECEDENCE.get(operators[-1][0], 0) >= precedence:
+                reduce()
+            operators.append((name, index))
+            expect_operand = True
+        elif name == "CLOSED_BRACKET":
+            while operators and operators[-1][0] != "OPEN_BRACKET":
+                reduce()
+            if not operators:
+                raise ValueError(f"Unmatched ')' at token {index + 1}")
+            operators.pop()
+            close_operand()
+        else:
+            raise ValueError(f"Expected an operator at token {index + 1}, got {tokens.value(index)!r}")
+
+    if not operands:
+        return None
+    if expect_operand:
+        raise ValueError("Expression ends with an operator")
+    while operators:
+        if operators[-1][0] == "OPEN_BRACKET":
+            raise ValueError("Unmatched '('")
+        reduce()
+    return operands[0]
+
+
+@timed("graph")
+def to_networkx(root):
+    '''
+    Converts an AST into a networkx DiGraph with integer nodes numbered in
+    preorder, and returns it with the {node: label} dict to draw it with.
+    networkx is only imported here, building the AST does not need it.
+    '''
+    import networkx as nx
+    tree = nx.DiGraph()
+    labels = {}
+    if root is None:
+        return tree, labels
+    stack = [(root, None)]
+    while stack:
+        node, parent = stack.pop()
+        id = len(labels)
+        labels[id] = node.label
+        tree.add_node(id)
+        if parent is not None:
+            tree.add_edge(parent, id)
+        stack.extend((child, id) for child in reversed(node.children))
+    PROFILE.count("graph nodes", len(labels))
+    return tree, labels
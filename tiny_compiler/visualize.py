@@ -0,0 +1,178 @@
+"""
+Drawing of abstract syntax trees and parse trees with networkx and
+matplotlib. Neither is imported until something is drawn, so importing
+this module (and the GUI that uses it) stays cheap. Trees are laid out by
+tiny_compiler.layout, without Graphviz.
+"""
+import random
+from .cache import LAYOUT_CACHE
+from .layout import tree_layout
+from .profiling import PROFILE, timed
+from .syntax_tree import Node, build_ast, to_networkx
+
+
+@timed("layout")
+def hierarchy_pos(G, root=None, width=1., vert_gap=0.2, vert_loc=0, xcenter=0.5):
+    '''
+    Based on Joel's answer at https://stackoverflow.com/a/29597209/2966723.
+    Licensed under Creative Commons Attribution-Share Alike
+
+    If the graph is a tree this will return the positions to plot this in a
+    hierarchical layout. Every node gets a share of its parent's width in
+    proportion to the leaves under it, so wide subtrees get room instead of
+    all siblings splitting it evenly. The tree is walked once with an
+    explicit stack, so depth is not limited by the recursion limit.
+
+    G: the graph (must be a tree)
+
+    root: the root node of current branch
+    - if the tree is directed and this is not given,
+      the node without parent is used
+    - if the tree is directed and this is given, then
+      the positions will be just for the descendants of this node.
+    - if the tree is undirected and not given,
+      then a random choice will be used.
+
+    width: horizontal space allocated for this branch - avoids overlap with other branches
+
+    vert_gap: gap between levels of hierarchy
+
+    vert_loc: vertical location of root
+
+    xcenter: horizontal location of root
+    '''
+    import networkx as nx
+    directed = isinstance(G, nx.DiGraph)
+    # a given root of a directed tree only lays out its descendants
+    whole = root is None or not directed
+    if root is None:
+        if directed:
+            root = next((node for node, degree in G.in_degree() if degree == 0), None)
+            if root is None:
+                raise TypeError('cannot use hierarchy_pos on a graph that is not a tree')
+        else:
+            root = random.choice(list(G.nodes))
+
+    # preorder walk from root, keeping every node's children
+    parent = {root: None}
+    children = {}
+    order = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        order.append(node)
+        below = [child for child in G.neighbors(node) if directed or child != parent[node]]
+        for child in below:
+            if child in parent:
+                raise TypeError('cannot use hierarchy_pos on a graph that is not a tree')
+            parent[child] = node
+        children[node] = below
+        stack.extend(reversed(below))
+    if whole and len(order) != len(G):
+        raise TypeError('cannot use hierarchy_pos on a graph that is not a tree')
+
+    leaves = {}
+    for node in reversed(order):
+        leaves[node] = sum(leaves[child] for child in children[node]) or 1
+    share = width * 1. / leaves[root]
+    pos = {root: (xcenter, vert_loc)}
+    left = {root: xcenter - width / 2}
+    for node in order:
+        x = left[node]
+        y = pos[node][1] - vert_gap
+        for child in children[node]:
+            span = share * leaves[child]
+            left[child] = x
+            pos[child] = (x + span / 2, y)
+            x += span
+    return pos
+
+
+def cached_layout(kind, tree, labels, layout):
+    '''Positions of a tree from LAYOUT_CACHE, computed with layout() and stored the first time.'''
+    key = LAYOUT_CACHE.key(kind, tree, labels)
+    pos = LAYOUT_CACHE.get(key)
+    if pos is None:
+        pos = layout()
+        LAYOUT_CACHE.put(key, pos)
+    return pos
+
+
+def ast_layout(text):
+    '''
+    Builds the AST of text (or takes the root Node of one) and places its
+    nodes. Returns (tree, labels, pos), pos being None for a single node, or
+    None for an empty input. Nothing here touches matplotlib, so it may run
+    off the GUI thread.
+    '''
+    root = text if isinstance(text, Node) else build_ast(text)
+    if root is None:
+        return None
+    tree, labels = to_networkx(root)
+    if len(tree) == 1:
+        return tree, labels, None
+    return tree, labels, cached_layout("tidy ast", tree, labels, lambda: tree_layout(tree))
+
+
+@timed("draw")
+def show_ast(layout, verbose=False):
+    '''Draws a layout from ast_layout, on the GUI thread.'''
+    if layout is None:
+        return
+    import matplotlib.pyplot as plt
+    import networkx as nx
+    tree, labels, pos = layout
+    if verbose: print(labels)
+    if pos is None:
+        nx.draw_networkx(tree, labels=labels, node_size=len(labels[0])*360)
+    else:
+        nx.draw_networkx(tree, pos=pos, labels=labels, node_size=[len(labels[node]) * 300 for node in list(tree.nodes)])
+    plt.get_current_fig_manager().set_window_title("Abstract Syntax Tree Visualizer")
+    plt.tight_layout()
+    plt.show()
+
+
+def draw_ast(text, verbose=False):
+    show_ast(ast_layout(text), verbose)
+
+
+@timed("graph")
+def parse_tree_graph(trace):
+    '''
+    The parse tree a ParseTrace was given by the parser, as a networkx
+    DiGraph rooted at 0 with children in order, and its {node: label} dict.
+    '''
+    import networkx as nx
+    children, labels = trace.tree()
+    tree = nx.DiGraph()
+    tree.add_nodes_from(labels)
+    tree.add_edges_from((node, child) for node, below in children.items() for child in below)
+    PROFILE.count("graph nodes", len(labels))
+    return tree, labels
+
+
+def parse_tree_layout(trace):
+    '''
+    Builds the parse tree of a ParseTrace and places its nodes. Returns
+    (tree, labels, pos) for show_parse_tree; like ast_layout it leaves
+    matplotlib alone.
+    '''
+    tree, labels = parse_tree_graph(trace)
+    pos = cached_layout("tidy parse tree", tree, labels, lambda: tree_layout(tree))
+    return tree, labels, pos
+
+
+@timed("draw")
+def show_parse_tree(layout):
+    '''Draws a layout from parse_tree_layout, on the GUI thread.'''
+    import matplotlib.pyplot as plt
+    import networkx as nx
+    tree, labels, pos = layout
+    nx.draw_networkx(tree, pos=pos, labels=labels, node_size=[len(labels[node]) * 260 for node in list(tree.nodes)])
+    plt.tight_layout()
+    plt.get_current_fig_manager().set_window_title("Parse Tree Visualizer")
+    plt.show()
+
+
+def draw_parse_tree(trace):
+    show_parse_tree(parse_tree_layout(trace))